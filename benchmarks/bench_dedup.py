@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from dedup import MinHasher, cluster, document_text, DEDUP_BANDS, DEDUP_THRESHOLD
+
+# Scaling and accuracy of the MinHash/LSH dedup stage without a database.
+# Every corpus has distinct synthetic postings plus planted near-duplicates:
+# copies of an earlier posting under another job_id with a few words edited,
+# the way reposts and syndicated copies differ. Signing and clustering are
+# timed at each size (time per document should stay flat if cost is
+# near-linear), and the clusters are checked against the planted copies.
+#
+# Usage (from the repo root):
+#   python benchmarks/bench_dedup.py --sizes 10000 50000 100000 --duplicate-rate 0.1
+
+VOCABULARY_SIZE = 5000
+
+
+def make_corpus(count, duplicate_rate, edit_rate, seed=0):
+    # -> (texts, source) where source[i] is the index i was copied from, or i
+    rng = random.Random(seed)
+    vocabulary = [f"w{index}" for index in range(VOCABULARY_SIZE)]
+    texts, source = [], []
+    for index in range(count):
+        if index and rng.random() < duplicate_rate:
+            original = source[rng.randrange(index)]
+            words = texts[original].split()
+            for position in rng.sample(range(len(words)), int(len(words) * edit_rate)):
+                words[position] = rng.choice(vocabulary)
+            texts.append(' '.join(words))
+            source.append(original)
+        else:
+            description = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(150, 400)))
+            texts.append(document_text(f"Data Engineer {rng.randrange(50)}", f"Company {rng.randrange(1000)}",
+                                       description))
+            source.append(index)
+    return texts, np.array(source)
+
+
+def score(clusters, source):
+    # Planted copies found, and documents put in a cluster with a posting
+    # they were not copied from
+    canonical = np.arange(len(source))
+    for member, root, _ in clusters:
+        canonical[member] = root
+    copies = np.flatnonzero(source != np.arange(len(source)))
+    found = int(np.sum(canonical[copies] == canonical[source[copies]]))
+    # Per cluster, the members should all share one original
+    wrong = 0
+    groups = {}
+    for member, root, _ in clusters:
+        groups.setdefault(root, []).append(source[member])
+    for originals in groups.values():
+        values, counts = np.unique(originals, return_counts=True)
+        wrong += len(originals) - counts.max()
+    return len(copies), found, wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark MinHash/LSH near-duplicate clustering')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 100000])
+    parser.add_argument('--duplicate-rate', type=float, default=0.1)
+    parser.add_argument('--edit-rate', type=float, default=0.03, help='share of words changed in a copy')
+    parser.add_argument('--threshold', type=float, default=DEDUP_THRESHOLD)
+    args = parser.parse_args()
+
+    print(f"{'docs':>8}{'sign s':>9}{'cluster s':>11}{'us/doc':>9}{'copies':>9}{'found':>9}{'wrong':>7}")
+    for size in args.sizes:
+        texts, source = make_corpus(size, args.duplicate_rate, args.edit_rate)
+        hasher = MinHasher()
+
+        start = time.perf_counter()
+        signatures, _ = hasher.signatures(texts)
+        signed = time.perf_counter()
+        clusters = cluster(signatures, np.arange(size), DEDUP_BANDS, args.threshold)
+        done = time.perf_counter()
+
+        copies, found, wrong = score(clusters, source)
+        print(f"{size:>8}{signed - start:>9.2f}{done - signed:>11.2f}{(done - start) / size * 1e6:>9.1f}"
+              f"{copies:>9}{found:>9}{wrong:>7}")
+
+
+if __name__ == "__main__":
+    main()
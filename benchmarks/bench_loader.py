@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from db import connect_to_db
+from loader import create_job_table, insert_into_job_table, bulk_insert_into_job_table
+
+# Compares the original per-row check-then-insert against the COPY + merge
+# bulk loader. Each run loads into a fresh throwaway schema so the real jobs
+# table is never touched.
+#
+# Usage (from the repo root):
+#   python benchmarks/bench_loader.py --sizes 1000 10000 100000
+
+BENCH_SCHEMA = 'bench_loader'
+
+
+def make_jobs(count, offset=0):
+    jobs = []
+    for i in range(offset, offset + count):
+        jobs.append({
+            'job_id': f'bench-{i:09d}',
+            'title': f'Data Engineer {i % 50}',
+            'location': 'Seattle, WA',
+            'company_name': f'Company {i % 1000}',
+            'description': 'Build and maintain batch and streaming pipelines. ' * 20,
+            'qualifications': 'Python,SQL,Spark,Airflow',
+            'benefits': 'Health insurance,401k',
+            'responsibilities': 'Own the warehouse,Review pull requests',
+            'posted_at': f'{i % 30} days ago',
+            'schedule_type': 'Full-time',
+            'dental_coverage': 'True',
+            'health_coverage': 'True',
+            'qualification_items': ['Python', 'SQL', 'Spark', 'Airflow'],
+            'benefit_items': ['Health insurance', '401k'],
+            'responsibility_items': ['Own the warehouse', 'Review pull requests']
+        })
+    return jobs
+
+
+def reset_schema(conn):
+    cursor = conn.cursor()
+    cursor.execute(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE')
+    cursor.execute(f'CREATE SCHEMA {BENCH_SCHEMA}')
+    cursor.execute(f'SET search_path TO {BENCH_SCHEMA}')
+    conn.commit()
+    cursor.close()
+    create_job_table(conn)
+
+
+def time_load(conn, load, jobs):
+    reset_schema(conn)
+    start = time.perf_counter()
+    load(conn, jobs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark row-by-row vs bulk job loading')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--skip-row', action='store_true',
+                        help='only run the bulk loader (the row path is slow at 100k over SSL)')
+    args = parser.parse_args()
+
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to db")
+        return
+
+    results = []
+    try:
+        for size in args.sizes:
+            jobs = make_jobs(size)
+
+            # Half the batch already exists on the second pass so the skip path
+            # is measured as well as the insert path
+            rerun = jobs[: size // 2] + make_jobs(size - size // 2, offset=size)
+
+            if not args.skip_row:
+                elapsed = time_load(conn, insert_into_job_table, jobs)
+                results.append(('row', size, elapsed))
+
+            elapsed = time_load(conn, bulk_insert_into_job_table, jobs)
+            results.append(('bulk', size, elapsed))
+
+            reset_schema(conn)
+            bulk_insert_into_job_table(conn, jobs)
+            start = time.perf_counter()
+            bulk_insert_into_job_table(conn, rerun)
+            results.append(('bulk (50% existing)', size, time.perf_counter() - start))
+    finally:
+        cursor = conn.cursor()
+        cursor.execute(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE')
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    print()
+    print(f"{'mode':<22}{'rows':>10}{'seconds':>12}{'rows/sec':>14}")
+    for mode, size, elapsed in results:
+        print(f"{mode:<22}{size:>10}{elapsed:>12.3f}{size / elapsed:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import io
+import os
+import csv
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timezone
+
+import pyarrow.csv as pa_csv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from loader import JOB_COLUMNS, HIGHLIGHT_ITEM_COLUMNS, pg_array_literals
+from normalize import normalize_jobs_loop, normalize_jobs_table
+
+# Compares the per-job dict loop against the columnar normalize_jobs_table on
+# synthetic SerpAPI jobs_results, and checks both produce the same rows.
+# Besides normalisation alone it times normalisation plus building the COPY
+# payload, since that is what the loader actually pays for: Python rows
+# through the csv module vs Arrow's CSV writer.
+#
+# Usage (from the repo root):
+#   python benchmarks/bench_normalize.py --sizes 100000 500000
+
+
+def make_raw_jobs(count, seed=0):
+    rng = random.Random(seed)
+    jobs = []
+    for i in range(count):
+        highlights = [
+            {'title': 'Qualifications', 'items': [f'{rng.randint(1, 10)}+ years of Python', 'SQL, dbt', 'Spark']},
+            {'title': 'Responsibilities', 'items': ['Own pipelines', 'Review code, mentor']}
+        ]
+        if rng.random() < 0.6:
+            highlights.append({'title': 'Benefits', 'items': ['Health insurance', '401(k)']})
+        if rng.random() < 0.1:
+            highlights.append({'title': 'Other', 'items': ['Unclassified']})
+
+        extensions = {'posted_at': f'{rng.randint(1, 30)} days ago', 'schedule_type': 'Full-time'}
+        if rng.random() < 0.5:
+            extensions['health_coverage'] = True
+        if rng.random() < 0.3:
+            extensions['dental_coverage'] = True
+
+        jobs.append({
+            'title': f'Data Engineer {i % 50}',
+            'company_name': f'Company {i % 1000}',
+            'location': 'Seattle, WA',
+            'via': 'LinkedIn',
+            'description': 'Build and maintain batch and streaming pipelines. ' * 10,
+            'job_highlights': highlights,
+            'detected_extensions': extensions,
+            'job_id': f'raw-{i:09d}'
+        })
+    return jobs
+
+
+def as_stored(value):
+    # Postgres receives 'true' for a JSON true on the row path
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return value
+
+
+def check_equivalent(jobs):
+    # Same fetch time for both, posted_at_ts is resolved against it
+    fetched_at = datetime.now(timezone.utc)
+    loop_rows = normalize_jobs_loop(jobs, fetched_at)
+    frame_rows = normalize_jobs_table(jobs, fetched_at).to_pylist()
+    for expected, actual in zip(loop_rows, frame_rows):
+        for column, value in actual.items():
+            if as_stored(expected.get(column)) != value:
+                raise AssertionError(f"{expected['job_id']} {column}: {expected.get(column)!r} != {value!r}")
+
+
+def as_copied(value):
+    # Lists go to the TEXT[] columns as array literals
+    if isinstance(value, list):
+        return '{' + ','.join('"' + item.replace('\\', '\\\\').replace('"', '\\"') + '"' for item in value) + '}'
+    return as_stored(value)
+
+
+def loop_payload(jobs):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for job in normalize_jobs_loop(jobs):
+        writer.writerow([as_copied(job.get(column)) for column in JOB_COLUMNS])
+    return buffer.getvalue()
+
+
+def table_payload(jobs):
+    table = normalize_jobs_table(jobs)
+    for column in HIGHLIGHT_ITEM_COLUMNS:
+        table = table.set_column(table.column_names.index(column), column, pg_array_literals(table[column]))
+    buffer = io.BytesIO()
+    pa_csv.write_csv(table, buffer, pa_csv.WriteOptions(include_header=False))
+    return buffer.getvalue()
+
+
+def timed(label, size, fn, jobs):
+    start = time.perf_counter()
+    fn(jobs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16}{size:>10}{elapsed:>10.2f}{elapsed / size * 1e6:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark job normalisation')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 500000])
+    args = parser.parse_args()
+
+    check_equivalent(make_raw_jobs(2000, seed=1))
+
+    print(f"{'mode':<16}{'records':>10}{'seconds':>10}{'us/record':>12}")
+    for size in args.sizes:
+        jobs = make_raw_jobs(size)
+        timed('loop', size, normalize_jobs_loop, jobs)
+        timed('table', size, normalize_jobs_table, jobs)
+        timed('loop + copy', size, loop_payload, jobs)
+        timed('table + copy', size, table_payload, jobs)
+
+
+if __name__ == "__main__":
+    main()
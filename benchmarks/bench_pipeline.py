@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import glob
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import psycopg
+
+from fake_serpapi import FakeSerpApi
+
+# End-to-end benchmark of call_api.main() with no API credits and no
+# production database: searches are answered by the local fake SerpAPI and
+# rows land in a throwaway Postgres cluster (initdb + pg_ctl) that is deleted
+# afterwards. Each scale runs twice in its own working directory: a cold run
+# against an empty database, then a warm run that exercises the seen-job
+# index and early pagination stop. Throughput and per-stage latencies come
+# from the pipeline's own metrics summary. Results are saved as JSON and can
+# be compared against an earlier file.
+#
+# Needs the Postgres server binaries on PATH (or PG_BIN).
+#
+# Usage (from the repo root):
+#   python benchmarks/bench_pipeline.py --scales 1000 10000 --latency 0.05
+#   python benchmarks/bench_pipeline.py --compare benchmarks/results/pipeline-<timestamp>.json
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SCRIPTS_DIR = os.path.join(REPO_ROOT, 'scripts')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class EphemeralPostgres:
+    # A private cluster in a temp directory, reachable only over a unix
+    # socket in that directory. fsync is off: the benchmark measures the
+    # pipeline, not the disk.
+
+    def __init__(self, dbname='jobs_db'):
+        self.dbname = dbname
+        self.bin_dir = os.getenv('PG_BIN') or os.path.dirname(shutil.which('pg_ctl') or '')
+        if not self.bin_dir or not os.path.exists(os.path.join(self.bin_dir, 'initdb')):
+            raise RuntimeError("initdb/pg_ctl not found, put the Postgres binaries on PATH or set PG_BIN")
+        self.data_dir = tempfile.mkdtemp(prefix='bench-pg-')
+        self.port = free_port()
+
+    def _run(self, tool, *args):
+        subprocess.run([os.path.join(self.bin_dir, tool), *args], check=True, capture_output=True)
+
+    def start(self):
+        self._run('initdb', '-D', self.data_dir, '-U', 'postgres', '--auth=trust', '-E', 'UTF8')
+        options = f"-p {self.port} -k {self.data_dir} -c listen_addresses='' -c fsync=off"
+        self._run('pg_ctl', '-D', self.data_dir, '-o', options, '-l',
+                  os.path.join(self.data_dir, 'server.log'), '-w', 'start')
+        return self
+
+    def stop(self):
+        try:
+            self._run('pg_ctl', '-D', self.data_dir, '-m', 'fast', '-w', 'stop')
+        finally:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def admin_connect(self):
+        return psycopg.connect(host=self.data_dir, port=self.port, user='postgres', dbname='postgres',
+                               autocommit=True)
+
+    def reset_database(self):
+        with self.admin_connect() as conn:
+            conn.execute(f"DROP DATABASE IF EXISTS {self.dbname} WITH (FORCE)")
+            conn.execute(f"CREATE DATABASE {self.dbname}")
+
+    def count_jobs(self):
+        with psycopg.connect(host=self.data_dir, port=self.port, user='postgres', dbname=self.dbname) as conn:
+            return conn.execute("SELECT count(*) FROM jobs").fetchone()[0]
+
+    def env(self):
+        return {
+            'DB_HOST': self.data_dir,
+            'DB_PORT': str(self.port),
+            'DB_NAME': self.dbname,
+            'DB_USER': 'postgres',
+            'DB_PASSWORD': '',
+            'DB_SSLMODE': 'disable'
+        }
+
+
+def write_query_config(workdir, search_count, stop_after):
+    config = {
+        'defaults': {'stop_after_known_pages': stop_after},
+        'searches': [{'q': f"bench search {i:04d}"} for i in range(search_count)]
+    }
+    with open(os.path.join(workdir, 'queries.json'), 'w') as f:
+        json.dump(config, f)
+
+
+def run_pipeline(workdir, env):
+    # Fresh interpreter per run so module-level config and the process-wide
+    # singletons (metrics, pool, cache) start clean
+    before = set(glob.glob(os.path.join(workdir, 'metrics', 'run-*.json')))
+    started = datetime.now(timezone.utc)
+    subprocess.run([sys.executable, '-c', 'import call_api; call_api.main()'], cwd=workdir, env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+    wall = (datetime.now(timezone.utc) - started).total_seconds()
+
+    summaries = sorted(set(glob.glob(os.path.join(workdir, 'metrics', 'run-*.json'))) - before)
+    with open(summaries[-1]) as f:
+        return wall, json.load(f)
+
+
+def stage_figures(summary, stage):
+    figures = summary['stages'].get(stage, {})
+    return {
+        'count': figures.get('count', 0),
+        'total_seconds': figures.get('total_seconds', 0.0),
+        'p50_seconds': figures.get('p50_seconds', 0.0),
+        'p95_seconds': figures.get('p95_seconds', 0.0)
+    }
+
+
+def bench_scale(pg, fake, args, scale):
+    jobs_per_search = args.pages * args.page_size
+    search_count = max(1, scale // jobs_per_search)
+    workdir = tempfile.mkdtemp(prefix=f'bench-pipeline-{scale}-')
+    write_query_config(workdir, search_count, args.stop_after)
+    pg.reset_database()
+
+    env = {
+        **os.environ,
+        **pg.env(),
+        'DOTENV': 'off',
+        'PYTHONPATH': SCRIPTS_DIR,
+        'SERPAPI_BASE_URL': f"http://127.0.0.1:{args.server_port}",
+        'SERPAPI_API_KEY': 'bench',
+        'SERPAPI_RATE_PER_SEC': str(args.rate),
+        'SERPAPI_BURST': str(max(1, int(args.rate))),
+        'SERPAPI_BACKOFF_BASE': '0.05',
+        'SERPAPI_REQUEST_BUDGET': '0',
+        'RESPONSE_CACHE_MODE': 'off',
+        'PIPELINE_MODE': args.mode,
+        'FETCH_WORKERS': str(args.workers),
+        'QUERY_CONFIG': 'queries.json'
+    }
+
+    results = []
+    try:
+        for phase in ('cold', 'warm'):
+            requests_before = fake.counts['requests']
+            wall, summary = run_pipeline(workdir, env)
+            results.append({
+                'scale': scale,
+                'phase': phase,
+                'searches': search_count,
+                'wall_seconds': round(wall, 3),
+                'api_requests': fake.counts['requests'] - requests_before,
+                'rows_in_db': pg.count_jobs(),
+                'pages_per_sec': summary['pages_per_sec'],
+                'rows_per_sec': summary['rows_per_sec'],
+                'stages': {stage: stage_figures(summary, stage)
+                           for stage in ('fetch', 'normalize', 'hash', 'skills', 'seen_index', 'load', 'dedup')},
+                'counters': summary['counters']
+            })
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    # Slower than the baseline by more than tolerance counts as a regression
+    with open(baseline_path) as f:
+        baseline = {(run['scale'], run['phase']): run for run in json.load(f)['runs']}
+
+    regressions = 0
+    print()
+    print(f"{'scale':>8}{'phase':>7}{'rows/sec':>12}{'baseline':>12}{'change':>9}")
+    for run in results:
+        before = baseline.get((run['scale'], run['phase']))
+        if not before or not before['rows_per_sec']:
+            continue
+        change = run['rows_per_sec'] / before['rows_per_sec'] - 1
+        flag = '  REGRESSION' if change < -tolerance else ''
+        regressions += bool(flag)
+        print(f"{run['scale']:>8}{run['phase']:>7}{run['rows_per_sec']:>12.0f}{before['rows_per_sec']:>12.0f}"
+              f"{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end pipeline benchmark against local stand-ins')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000], help='jobs per run')
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=10, help='pages per search')
+    parser.add_argument('--latency', type=float, default=0.0, help='mean fake API latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of fake API requests that 503')
+    parser.add_argument('--mode', choices=['stream', 'batch'], default='stream')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=1000, help='SERPAPI_RATE_PER_SEC for the run')
+    parser.add_argument('--stop-after', type=int, default=2, help='stop_after_known_pages for every search')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed rows/sec drop before flagging')
+    parser.add_argument('--keep', action='store_true', help='keep each run\'s working directory')
+    args = parser.parse_args()
+
+    fake = FakeSerpApi(args.page_size, args.pages, args.latency, args.error_rate)
+    server = fake.serve()
+    args.server_port = server.server_port
+
+    pg = EphemeralPostgres().start()
+    runs = []
+    try:
+        for scale in args.scales:
+            runs.extend(bench_scale(pg, fake, args, scale))
+    finally:
+        pg.stop()
+        server.shutdown()
+
+    print()
+    print(f"{'scale':>8}{'phase':>7}{'requests':>10}{'wall s':>9}{'pages/s':>10}{'rows/s':>10}"
+          f"{'fetch p95':>11}{'norm s':>9}{'load s':>9}")
+    for run in runs:
+        stages = run['stages']
+        print(f"{run['scale']:>8}{run['phase']:>7}{run['api_requests']:>10}{run['wall_seconds']:>9.2f}"
+              f"{run['pages_per_sec']:>10.1f}{run['rows_per_sec']:>10.0f}{stages['fetch']['p95_seconds']:>11.3f}"
+              f"{stages['normalize']['total_seconds']:>9.2f}{stages['load']['total_seconds']:>9.2f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"pipeline-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json")
+    config = {key: value for key, value in vars(args).items() if key not in ('compare', 'keep', 'server_port')}
+    with open(path, 'w') as f:
+        json.dump({
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'config': config,
+            'runs': runs
+        }, f, indent=2)
+    print(f"\nSaved {path}")
+
+    if args.compare and compare(runs, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
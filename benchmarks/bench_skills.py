@@ -0,0 +1,111 @@
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from bench_normalize import make_raw_jobs
+from normalize import normalize_jobs_table
+from skills import SKILL_FIELDS, SkillMatcher, add_skills, load_skill_dictionary, tokenize
+
+# Throughput of the skill extraction stage: the token Aho-Corasick automaton
+# in skills.py against the obvious alternative, one regex search per skill
+# alias per document. The generator's descriptions are one repeated sentence,
+# so they are replaced with a few KB of filler prose with dictionary aliases
+# sprinkled in, about the size of a real posting. The regex baseline runs on
+# a sample and is extrapolated; both must find the same skills there.
+#
+# Usage (from the repo root):
+#   python benchmarks/bench_skills.py --docs 100000 --baseline-docs 2000
+
+FILLER = (
+    'we are looking for a motivated engineer to join our growing team and help build reliable '
+    'scalable systems that power decisions across the business you will partner with analysts '
+    'product managers and scientists to design develop and operate data products with a strong '
+    'focus on quality ownership and continuous improvement in a fast paced collaborative '
+    'environment experience with'
+).split()
+
+
+def make_documents(count, dictionary, seed=0):
+    rng = random.Random(seed)
+    aliases = [alias for names in dictionary.values() for alias in names]
+    jobs = make_raw_jobs(count, seed=seed)
+    for job in jobs:
+        words = []
+        for _ in range(rng.randint(300, 600)):
+            words.append(rng.choice(aliases).title() if rng.random() < 0.03 else rng.choice(FILLER))
+        job['description'] = ' '.join(words) + '.'
+    return normalize_jobs_table(jobs)
+
+
+def regex_matcher(dictionary):
+    # One compiled pattern per alias, with the same word rules as the
+    # automaton: whole tokens, any separator between the words of a phrase
+    patterns = []
+    for skill, names in dictionary.items():
+        for name in names:
+            words = tokenize(name)
+            if words:
+                body = r'(?:_|[^\w+#])+'.join(re.escape(word) for word in words)
+                patterns.append((skill, re.compile(r'(?<![^\W_]|[+#])' + body + r'(?![^\W_]|[+#])')))
+
+    def match(texts):
+        found = set()
+        for text in texts:
+            if text:
+                lowered = text.lower()
+                for skill, pattern in patterns:
+                    if skill not in found and pattern.search(lowered):
+                        found.add(skill)
+        return found
+    return match, len(patterns)
+
+
+def timed(label, docs, chars, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24}{docs:>10}{elapsed:>10.2f}{docs / elapsed:>12.0f}{chars / elapsed / 1e6:>10.2f}")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark skill extraction')
+    parser.add_argument('--docs', type=int, default=100000)
+    parser.add_argument('--baseline-docs', type=int, default=2000, help='documents for the per-skill regex run')
+    args = parser.parse_args()
+
+    dictionary = load_skill_dictionary()
+    build_start = time.perf_counter()
+    matcher = SkillMatcher(dictionary)
+    print(f"Automaton: {len(matcher.skills)} skills, {len(matcher.goto)} states, "
+          f"built in {(time.perf_counter() - build_start) * 1000:.1f} ms")
+
+    table = make_documents(args.docs, dictionary)
+    fields = [table[field].to_pylist() for field in SKILL_FIELDS]
+    chars = sum(len(text) for column in fields for text in column if text)
+    print(f"{args.docs} documents, {chars / args.docs:.0f} chars each on average\n")
+
+    print(f"{'mode':<24}{'docs':>10}{'seconds':>10}{'docs/sec':>12}{'MB/sec':>10}")
+    timed('automaton', args.docs, chars, lambda: add_skills(table, matcher))
+
+    sample = min(args.baseline_docs, args.docs)
+    sample_fields = [column[:sample] for column in fields]
+    sample_chars = sum(len(text) for column in sample_fields for text in column if text)
+    regex_match, pattern_count = regex_matcher(dictionary)
+    found, elapsed = timed(f'regex x {pattern_count}', sample, sample_chars,
+                           lambda: [regex_match(texts) for texts in zip(*sample_fields)])
+    print(f"{'regex (extrapolated)':<24}{args.docs:>10}{elapsed * args.docs / sample:>10.2f}")
+
+    expected = [set(matcher.match(texts)) for texts in zip(*sample_fields)]
+    mismatches = sum(1 for a, b in zip(expected, found) if a != b)
+    if mismatches:
+        raise AssertionError(f"automaton and regex disagree on {mismatches} of {sample} documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from bench_normalize import make_raw_jobs
+
+# Local stand-in for the SerpAPI google_jobs endpoint. Every search gets a
+# deterministic chain of pages of synthetic jobs_results (the generator from
+# bench_normalize) linked by next_page_token, so runs are repeatable and the
+# same search always returns the same jobs. Latency and a share of 503s are
+# injected to exercise the rate limiter and retries.
+#
+# Point the pipeline at it with SERPAPI_BASE_URL=http://127.0.0.1:<port>.
+#
+# Usage (from the repo root):
+#   python benchmarks/fake_serpapi.py --port 8765 --pages 5 --latency 0.2 --error-rate 0.02
+
+
+class FakeSerpApi:
+
+    def __init__(self, page_size=10, pages=5, latency=0.0, error_rate=0.0, seed=0):
+        self.page_size = page_size
+        self.pages = pages
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {'requests': 0, 'pages': 0, 'errors': 0}
+
+    def _roll(self):
+        with self._lock:
+            return self._random.random(), self._random.random()
+
+    def page(self, q, page_number):
+        # Job ids are derived from the search and position, so overlapping
+        # runs see the same ids and a rerun exercises the known-job paths
+        slug = hashlib.sha1(q.encode('utf-8')).hexdigest()[:10]
+        page_seed = int(hashlib.sha1(f"{self.seed}-{slug}-{page_number}".encode('utf-8')).hexdigest()[:8], 16)
+        jobs = make_raw_jobs(self.page_size, seed=page_seed)
+        for i, job in enumerate(jobs):
+            job['job_id'] = f"fake-{slug}-{page_number:04d}-{i:03d}"
+
+        response = {
+            'search_metadata': {'status': 'Success'},
+            'search_parameters': {'q': q, 'engine': 'google_jobs'},
+            'jobs_results': jobs
+        }
+        if page_number < self.pages:
+            response['serpapi_pagination'] = {'next_page_token': f"page-{page_number + 1}"}
+        return response
+
+    def handle(self, query):
+        # -> (status, headers, body)
+        error_roll, latency_roll = self._roll()
+        if self.latency:
+            # Uniform around the configured mean
+            time.sleep(self.latency * 2 * latency_roll)
+
+        with self._lock:
+            self.counts['requests'] += 1
+            if error_roll < self.error_rate:
+                self.counts['errors'] += 1
+                return 503, {'Retry-After': '0'}, {'error': 'Injected failure'}
+            self.counts['pages'] += 1
+
+        q = query.get('q', [''])[0]
+        token = query.get('next_page_token', [None])[0]
+        page_number = int(token.split('-')[1]) if token else 1
+        return 200, {}, self.page(q, page_number)
+
+    def serve(self, port=0, host='127.0.0.1'):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != '/search':
+                    self.send_error(404)
+                    return
+                status, headers, body = fake.handle(parse_qs(url.query))
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='fake-serpapi', daemon=True).start()
+        return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve fake SerpAPI google_jobs results')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=5, help='pages per search')
+    parser.add_argument('--latency', type=float, default=0.0, help='mean seconds per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 503')
+    args = parser.parse_args()
+
+    fake = FakeSerpApi(args.page_size, args.pages, args.latency, args.error_rate)
+    server = fake.serve(args.port)
+    print(f"Fake SerpAPI on http://127.0.0.1:{server.server_port} (Ctrl-C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(fake.counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+{#
+    Latest row per unique_key from relation.
+
+    On incremental runs only rows loaded since the target's high-water mark
+    on watermark_column are scanned. The lookback window re-reads a little
+    history so rows committed late by a concurrent load are not missed; the
+    overlap is harmless because the model's delete+insert strategy replaces
+    rows by unique_key. A full refresh (dbt build --full-refresh) rebuilds
+    from the whole relation.
+#}
+{% macro incremental_dedup(relation, unique_key, watermark_column, where=none) %}
+
+SELECT DISTINCT ON ({{ unique_key }}) *
+FROM {{ relation }}
+WHERE {{ unique_key }} IS NOT NULL
+{% if where %}
+  AND ({{ where }})
+{% endif %}
+{% if is_incremental() %}
+  AND {{ watermark_column }} > (
+      SELECT COALESCE(MAX({{ watermark_column }}), '-infinity'::timestamptz)
+             - INTERVAL '{{ var("watermark_lookback", "1 hour") }}'
+      FROM {{ this }}
+  )
+{% endif %}
+ORDER BY {{ unique_key }}, {{ watermark_column }} DESC
+
+{% endmacro %}
@@ -1,3 +1 @@
-
-SELECT *
-FROM {{ref('stage_jobs')}}
\ No newline at end of file
+{{ incremental_dedup(ref('stage_jobs'), 'job_id', 'ingested_at') }}
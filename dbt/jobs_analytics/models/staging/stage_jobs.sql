@@ -1,4 +1,17 @@
+{#
+    Near-duplicate postings (the same job reposted or syndicated under other
+    job_ids) are clustered by scripts/dedup.py into raw.job_clusters. Only
+    the canonical posting of each cluster is staged; jobs in no cluster are
+    their own canonical posting. A duplicate normally arrives after its
+    canonical posting and is dropped on the incremental run that would load
+    it; run with --full-refresh to apply a reclustering to older rows.
+#}
+{% set clustered_jobs %}
+(
+    SELECT jobs.*, COALESCE(clusters.canonical_job_id, jobs.job_id) AS canonical_job_id
+    FROM {{ source('raw', 'jobs') }} jobs
+    LEFT JOIN {{ source('raw', 'job_clusters') }} clusters USING (job_id)
+) clustered_jobs
+{% endset %}
 
-SELECT Distinct *
-FROM {{source('raw', 'jobs')}}
-WHERE job_id IS NOT NULL
+{{ incremental_dedup(clustered_jobs, 'job_id', 'ingested_at', where='job_id = canonical_job_id') }}
@@ -1,45 +1,69 @@
 import os
-import json
+import uuid
+import queue
 import logging
-import psycopg
+from datetime import datetime, timezone
 from serpapi import GoogleSearch
 from dotenv import load_dotenv
-
-load_dotenv(override=True)
+from db import get_pool, close_pool, pool_stats, DOTENV_ENABLED
+from loader import (create_job_table, insert_into_job_table, bulk_insert_into_job_table, load_from_queue,
+                    count_known_jobs)
+from normalize import normalize_jobs_table, add_load_metadata
+from skills import add_skills
+from dedup import run_dedup
+from partitions import prune_job_partitions, JOBS_RETENTION_MONTHS
+from fetcher import fetch_all_queries, stream_pages, FETCH_WORKERS
+from queries import load_query_specs
+from checkpoints import CheckpointStore
+from response_cache import get_response_cache
+from landing import land_page
+from seen_index import SeenIndex, skip_known
+from metrics import metrics, METRICS_PORT
+from log_setup import setup_logging
+from rate_limiter import get_search_executor, RetryableSearchError, THROTTLE_STATUSES
+
+if DOTENV_ENABLED:
+    load_dotenv(override=True)
+
+# Point the SerpAPI client somewhere else, e.g. the benchmark stand-in
+SERPAPI_BASE_URL = os.getenv('SERPAPI_BASE_URL')
+
+# Seconds to wait on SerpAPI before a request fails with requests.Timeout,
+# which the executor retries and counts towards the circuit breaker. The
+# client's own default is 60000.
+SERPAPI_TIMEOUT = float(os.getenv('SERPAPI_TIMEOUT', '30'))
 
 
 def create_logger():
-    log_dir = 'logs'
-    file_name = 'call_api_log.log'
-    os.makedirs(log_dir, exist_ok=True)
-
-    logging.basicConfig(
-        filename=os.path.join(log_dir, file_name),
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-
+    # JSON lines through a background writer into logs/call_api_log.log
+    setup_logging('call_api_log.log')
 
-def load_token():
-    if os.path.exists('pagination_state.json'):
-        with open('pagination_state.json', 'r') as f:
-            return json.load(f).get('next_page_token')
-    return None
 
+def search_serpapi(params):
+    # Raw SerpAPI call. get_response keeps the HTTP status, which get_dict
+    # throws away, so throttling and server errors can be retried.
+    search = GoogleSearch(params)
+    search.timeout = SERPAPI_TIMEOUT
+    if SERPAPI_BASE_URL:
+        search.BACKEND = SERPAPI_BASE_URL
+    response = search.get_response()
+
+    if response.status_code in THROTTLE_STATUSES:
+        retry_after = response.headers.get('Retry-After')
+        raise RetryableSearchError(
+            f"SerpAPI returned {response.status_code}",
+            status=response.status_code,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+        )
 
-def save_token(token):
-    with open('pagination_state.json', 'w') as f:
-        json.dump({'next_page_token': token}, f)
-
+    return response.json()
 
-def call_api():
-    # Load token from pagination_state.json file
-    token = load_token()
 
-    # Parameter for querying
+def call_api(spec, token=None):
+    # Parameter for querying, extra per-search params come from the query config
     params = {
-        'q': 'data engineer seattle',
+        **spec.get('params', {}),
+        'q': spec['q'],
         'engine': 'google_jobs',
         'api_key': os.getenv('SERPAPI_API_KEY'),
         'output': 'json'
@@ -49,8 +73,13 @@ def call_api():
     if token:
         params['next_page_token'] = token
 
-    search = GoogleSearch(params)
-    results = search.get_dict()
+    # Reruns and backfills of the same search/token are served from disk
+    executor = get_search_executor()
+    with metrics.timer('fetch'):
+        results = get_response_cache().fetch(params, lambda: executor.execute(spec['key'], lambda: search_serpapi(params)))
+
+    if 'error' in results and 'jobs_results' not in results:
+        logging.info(f"[{spec['key']}] SerpAPI error: {results['error']}")
 
     # Access the serpapi_pagination dict from nested json dict
     pagination = results.get('serpapi_pagination')
@@ -59,204 +88,202 @@ def call_api():
     next_token = None
     if pagination:
         next_token = pagination.get('next_page_token')
-    
 
-    if 'jobs_results' in results:
-        jobs = results['jobs_results']
+    # Jobs are returned raw, normalisation runs once per load batch in
+    # normalize_jobs_table instead of job by job here
+    jobs = results.get('jobs_results') or []
+    metrics.inc('pipeline_pages_total')
+    metrics.inc('pipeline_jobs_fetched_total', len(jobs))
+    return jobs, next_token
+
 
-        # Get just the first job
-        if jobs:
-            job_list = []  # Make sure the list isn't empty
-            for job in jobs:
-                # Extract Nested Dictionary Data
-                job_data = {
-                    'title': job.get('title', ''),
-                    'location': job.get('location', ''),
-                    'company_name': job.get('company_name', ''),
-                    'description': job.get('description', ''),
-                    'job_id': job.get('job_id', '')
-                }
+def open_pool():
+    try:
+        return get_pool()
+    except Exception as e:
+        print("Failed to connect to db")
+        logging.info(f"Failed to connect to db: {e}")
+        return None
 
-                # Extract Job highlights info out of job_highlights list of dictionaries.
-                job_highlights = job.get('job_highlights', [])
 
-                for highlight in job_highlights:
-                    title = highlight.get('title', "").lower()
-                    item = highlight.get('items', [])
+def load_preparer(run_id):
+    # Raw jobs plus the search each came from -> normalised table with the
+    # ingestion metadata columns and the skills extracted from each job
+    def prepare(jobs, queries):
+        return add_skills(add_load_metadata(normalize_jobs_table(jobs), run_id, queries))
+    return prepare
 
-                    if "qualification" in title:
-                        job_data['qualifications'] = ','.join(item)
-                    elif 'benefits' in title:
-                        job_data['benefits'] = ','.join(item)
-                    elif 'responsibilities' in title:
-                        job_data['responsibilities'] = ','.join(item)
 
-                # Extract extension data form extensions dictionary
-                extensions = job.get('detected_extensions', {})
+def job_loader(seen):
+    # SEEN_INDEX=off sends every job to the database merge
+    if seen is None:
+        return bulk_insert_into_job_table
+    return skip_known(seen, bulk_insert_into_job_table)
 
-                job_data['posted_at'] = extensions.get('posted_at', '')
-                job_data['schedule_type'] = extensions.get('schedule_type', '')
-                job_data['dental_coverage'] = extensions.get(
-                    'dental_coverage', '')
-                job_data['health_coverage'] = extensions.get(
-                    'health_coverage', '')
 
-                job_list.append(job_data)
+def known_page_check(seen):
+    # For the incremental crawl: is every job on a page already stored? The
+    # seen-job index answers locally, without it the database is asked.
+    def is_known(jobs):
+        job_ids = {job.get('job_id') for job in jobs}
+        if None in job_ids:
+            return False
+        if seen is not None:
+            return seen.contains_all(job_ids)
+        try:
+            with get_pool().connection() as conn:
+                return count_known_jobs(conn, job_ids) == len(job_ids)
+        except Exception as e:
+            logging.info(f"Known-page check failed, continuing the chain: {e}")
+            return False
+    return is_known
 
-        return job_list, next_token
-    else:
-            return [], next_token
 
+def run_batch(queries, checkpoints, run_id, seen, on_page, on_chain_done):
+    # Fetch every page first, then load everything in one go
+    start_points = {spec['key']: checkpoints.resume_point(spec['key']) for spec in queries}
+    results = fetch_all_queries(queries, call_api, workers=FETCH_WORKERS, start_points=start_points,
+                                on_page=on_page, on_chain_done=on_chain_done,
+                                is_known=known_page_check(seen))
 
+    all_jobs = []  # Store jobs from ALL queries and pages
+    all_queries = []
+    for spec in queries:
+        jobs = results.get(spec['key'], [])
+        all_jobs.extend(jobs)
+        all_queries.extend([spec['key']] * len(jobs))
 
-def connect_to_db():
-    try:
-        conn = psycopg.connect(
-            host = os.getenv('DB_HOST'),
-            dbname = "jobs_db",
-            user = "postgres",
-            password = os.getenv('DB_PASSWORD'),
-            port = 5432,
-            sslmode = "require",
-            connect_timeout = 10
-        )
-        print("Connection Successful")
-        return conn
+    logging.info(f"Final total: {len(all_jobs)} jobs")
 
+    pool = open_pool()
+    if not pool:
+        return
+
+    try:
+        with pool.connection() as conn:
+            create_job_table(conn)
+
+            # LOAD_MODE=row keeps the original check-then-insert path around
+            table = load_preparer(run_id)(all_jobs, all_queries)
+            if os.getenv('LOAD_MODE', 'bulk') == 'row':
+                insert_into_job_table(conn, table.to_pylist())
+            else:
+                job_loader(seen)(conn, table)
+        # Failed chains are missing from results and keep their watermark,
+        # so a resumed run fetches their dropped pages again
+        checkpoints.record_all_fetched_loaded([spec['key'] for spec in queries if spec['key'] in results])
     except Exception as e:
-        print("Connection Failed")
-        return None
+        logging.info(f"Load failed, checkpoints left at the previous watermark: {e}")
 
 
-def create_job_table(conn):
-    # # Move this to main later!!!!
-    # conn = connect_to_db()
-
-    cursor = conn.cursor()
-
-    create_jobs_table_query = """
-    CREATE TABLE IF NOT EXISTS jobs (
-        job_id VARCHAR(100) PRIMARY KEY NOT NULL,
-        title VARCHAR(100),
-        location VARCHAR(100),
-        company_name VARCHAR(100),
-        description VARCHAR(5000),
-        qualifications VARCHAR(5000),
-        benefits VARCHAR(500),
-        responsibilities VARCHAR(5000),
-        posted_at VARCHAR(100),
-        schedule_type VARCHAR(100),
-        dental_coverage VARCHAR(100),
-        health_coverage VARCHAR(100)
-    )
-    """
-    cursor.execute(create_jobs_table_query)
-    conn.commit()
-    cursor.close()
-    
-def insert_into_job_table(conn, all_jobs):
-
-    cursor = conn.cursor()
-
-    insert_query = """
-    INSERT INTO 
-    jobs ( job_id, title, location, company_name, description, qualifications, benefits, responsibilities, posted_at, schedule_type, dental_coverage,health_coverage)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
-
-    check_query = """ SELECT job_id FROM jobs WHERE job_id = %s"""
-
-    skip_count = 0
-    insert_count = 0
-    for job in all_jobs:
-        cursor.execute(check_query, (job.get('job_id'),))
-        exists = cursor.fetchone()
-
-        if exists:
-            print("job already exists")
-            skip_count += 1
-            continue
-        # Insert into table
-        try:
-            cursor.execute(insert_query, (
-                job.get('job_id'),
-                job.get('title'),
-                job.get('location'),
-                job.get('company_name'),
-                job.get('description'),
-                job.get('qualifications'),
-                job.get('benefits'),
-                job.get('responsibilities'),
-                job.get('posted_at'),
-                job.get('schedule_type'),
-                job.get('dental_coverage'),
-                job.get('health_coverage')
-            ))
-            insert_count += 1
-            print(f"Inserted job_id {job['job_id']}")
-            logging.info(f"Inserted job_if {job['job_id']}")
-        
-        except Exception as e:
-            print(f"Error inserting job_id {job['job_id']}")
-            logging.info(f"Error inserting job_id {job['job_id']}")
-            conn.rollback()
-            cursor = conn.cursor()
+def run_stream(queries, checkpoints, run_id, seen, on_page, on_chain_done):
+    # Fetchers push pages into a bounded queue while this thread loads them,
+    # so loading overlaps fetching and memory is capped by the queue depth
+    pool = open_pool()
+    if not pool:
+        return
+
+    with pool.connection() as conn:
+        create_job_table(conn)
+
+    page_queue = queue.Queue(maxsize=int(os.getenv('PAGE_QUEUE_DEPTH', '16')))
+    start_points = {spec['key']: checkpoints.resume_point(spec['key']) for spec in queries}
+    producer, stop = stream_pages(queries, call_api, page_queue, workers=FETCH_WORKERS,
+                                  start_points=start_points, on_page=on_page,
+                                  on_chain_done=on_chain_done, is_known=known_page_check(seen))
 
-    conn.commit()
-    cursor.close()
+    try:
+        with pool.connection() as conn:
+            load_from_queue(conn, page_queue, prepare=load_preparer(run_id), load=job_loader(seen),
+                            batch_size=int(os.getenv('LOAD_BATCH_SIZE', '500')),
+                            max_latency=float(os.getenv('LOAD_MAX_LATENCY', '5')),
+                            on_loaded=checkpoints.record_loaded)
+    finally:
+        # Unblock the fetchers if the writer stopped early
+        stop.set()
+        producer.join()
 
-    print(f"Summary: {insert_count} inserted, {skip_count} skipped")
-    logging.info(f"Summary: {insert_count} inserted, {skip_count} skipped")
 
 def main():
     create_logger()
     logging.info('Starting Script to call Google APIs')
 
-    all_jobs = []  # Store jobs from ALL pages
-    page_count = 0
-
-    while True:
-        page_count += 1
-        # Load token from pagination_state.json file
-        current_token = load_token()
-        logging.info(f"\n=== PAGE {page_count} ===")
-        logging.info(f"Starting with token: {current_token}")
+    # Every search in the sweep feeds the same fetch pool and loader
+    queries = load_query_specs()
+    logging.info(f"Running {len(queries)} searches")
 
-        # Get list of dicts and next_token variable from call_api function
-        page_jobs, next_token = call_api()  # Get jobs from current page
+    run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:6]}"
+    logging.info(f"Run id: {run_id}")
 
-        logging.info(f"Got {len(page_jobs) if page_jobs else 0} jobs")
-        logging.info(f"Next token from API: {next_token}")
+    checkpoints = CheckpointStore()
+    # Jobs already committed with the same content are skipped before the
+    # database is asked
+    seen = SeenIndex() if os.getenv('SEEN_INDEX', 'on') != 'off' else None
 
-        if not page_jobs:  # No more jobs
-            logging.info("No jobs found, breaking")
-            break
+    # Components with their own counters are read when metrics are exported
+    metrics.add_collector('response_cache', get_response_cache().stats)
+    metrics.add_collector('serpapi', get_search_executor().stats)
+    metrics.add_collector('db_pool', pool_stats)
+    if seen is not None:
+        metrics.add_collector('seen_index', seen.stats)
+    metrics_server = metrics.serve(METRICS_PORT) if METRICS_PORT else None
 
-        all_jobs.extend(page_jobs)  # Add this page's jobs to total
-        logging.info(f"Total jobs so far: {len(all_jobs)}")
+    def record_fetch(page):
+        # Land the raw page before checkpointing it, so anything the
+        # checkpoint says was fetched can be replayed from disk
+        land_page(page, run_id)
+        checkpoints.record_fetch(page['query'], page['page_number'], page['next_token'], len(page['jobs']))
 
-        # Check if we've reached the end
-        if not next_token:  # No more pages - No more next tokens == blank/False
-            logging.info("No next token, saving None and breaking")
-            save_token(None) # Save nothing as toke bc none exists
-            break
+    try:
+        # PIPELINE_MODE=batch keeps the fetch-everything-then-load behaviour
+        if os.getenv('PIPELINE_MODE', 'stream') == 'batch':
+            run_batch(queries, checkpoints, run_id, seen, record_fetch, checkpoints.record_fetch_done)
         else:
-            logging.info(f"Saving token for next iteration: {next_token}")
-            save_token(next_token) # Save this token for next iteration in pagination_state.jjson
-
-    logging.info(f"Final total: {len(all_jobs)} jobs")
-    # print(all_jobs[0])
-    # return all_jobs
-
-    conn = connect_to_db()
-    if not conn:
-        print("Failed to connect to db")
-        logging.info("Failed to connect to db")
-        return
-
-    create_job_table(conn)
-    insert_into_job_table(conn, all_jobs)
-    conn.close()
+            run_stream(queries, checkpoints, run_id, seen, record_fetch, checkpoints.record_fetch_done)
+
+        # Near-duplicate clustering over everything stored, after the loads.
+        # job_clusters is rebuilt in one transaction, so a failure here
+        # leaves the previous clustering in place and the run still counts.
+        if os.getenv('DEDUP', 'on') != 'off':
+            try:
+                with get_pool().connection() as conn:
+                    run_dedup(conn)
+            except Exception as e:
+                logging.info(f"Dedup stage failed, job_clusters left as it was: {e}")
+
+        # Retention by whole posting months, only when configured
+        if JOBS_RETENTION_MONTHS:
+            try:
+                with get_pool().connection() as conn:
+                    prune_job_partitions(conn, int(JOBS_RETENTION_MONTHS))
+            except Exception as e:
+                logging.info(f"Partition pruning failed, old partitions kept: {e}")
+    finally:
+        checkpoints.close()
+
+        if seen is not None:
+            seen.save()
+            seen_stats = seen.stats()
+            print(f"Seen-job index: {seen_stats}")
+            logging.info(f"Seen-job index: {seen_stats}")
+
+        # Written before the pool closes so its stats are still there
+        metrics.write_prometheus()
+        summary_path = metrics.write_summary(run_id, mode=os.getenv('PIPELINE_MODE', 'stream'),
+                                             searches=len(queries))
+        print(f"Metrics summary: {summary_path}")
+        logging.info(f"Metrics summary: {summary_path}")
+        if metrics_server:
+            metrics_server.shutdown()
+        close_pool()
+
+        cache_stats = get_response_cache().stats()
+        print(f"Response cache: {cache_stats}")
+        logging.info(f"Response cache: {cache_stats}")
+
+        request_stats = get_search_executor().stats()
+        print(f"SerpAPI requests: {request_stats}")
+        logging.info(f"SerpAPI requests: {request_stats}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+
+STATE_DIR = os.getenv('STATE_DIR', 'state')
+CHECKPOINT_DB = os.path.join(STATE_DIR, 'pagination_state.sqlite3')
+
+
+class CheckpointStore:
+    # Pagination checkpoints keyed by search spec key, kept in SQLite so every
+    # update is an atomic, fsynced transaction. Per query it records:
+    #   fetched_page / fetched_token  last page pulled from the API and the token after it
+    #   fetched_count                 jobs fetched so far in this chain
+    #   loaded_page / loaded_token    load watermark: last page committed to Postgres
+    #   fetch_done                    the chain ran out of pages
+    # A resumed run restarts each chain from loaded_token, so pages that are
+    # already in the database are not fetched again.
+
+    def __init__(self, path=CHECKPOINT_DB):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            query_key TEXT PRIMARY KEY,
+            fetched_page INTEGER NOT NULL DEFAULT 0,
+            fetched_token TEXT,
+            fetched_count INTEGER NOT NULL DEFAULT 0,
+            loaded_page INTEGER NOT NULL DEFAULT 0,
+            loaded_token TEXT,
+            fetch_done INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT
+        )
+        """)
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _now(self):
+        return datetime.now(timezone.utc).isoformat()
+
+    def get(self, query_key):
+        rows = self._execute("""
+        SELECT fetched_page, fetched_token, fetched_count, loaded_page, loaded_token, fetch_done
+        FROM checkpoints WHERE query_key = ?
+        """, (query_key,))
+        if not rows:
+            return None
+
+        fetched_page, fetched_token, fetched_count, loaded_page, loaded_token, fetch_done = rows[0]
+        return {
+            'fetched_page': fetched_page,
+            'fetched_token': fetched_token,
+            'fetched_count': fetched_count,
+            'loaded_page': loaded_page,
+            'loaded_token': loaded_token,
+            'fetch_done': bool(fetch_done)
+        }
+
+    def resume_point(self, query_key):
+        # (token, page_number) to start this chain from. A chain that was
+        # fetched and loaded to the end starts over from the first page.
+        checkpoint = self.get(query_key)
+        if not checkpoint:
+            return None, 1
+
+        if checkpoint['fetch_done'] and checkpoint['loaded_page'] >= checkpoint['fetched_page']:
+            self.reset(query_key)
+            return None, 1
+
+        if checkpoint['loaded_page'] and not checkpoint['loaded_token']:
+            # Last loaded page had no successor, nothing left to fetch
+            self.reset(query_key)
+            return None, 1
+
+        # Pages fetched but never loaded are fetched again, so rewind the fetch
+        # position to the watermark
+        self._execute("""
+        UPDATE checkpoints SET fetched_page = loaded_page, fetched_token = loaded_token, fetch_done = 0
+        WHERE query_key = ?
+        """, (query_key,))
+
+        if checkpoint['loaded_page']:
+            logging.info(f"[{query_key}] Resuming after loaded page {checkpoint['loaded_page']}")
+        return checkpoint['loaded_token'], checkpoint['loaded_page'] + 1
+
+    def record_fetch(self, query_key, page_number, next_token, job_count):
+        self._execute("""
+        INSERT INTO checkpoints (query_key, fetched_page, fetched_token, fetched_count, fetch_done, updated_at)
+        VALUES (?, ?, ?, ?, 0, ?)
+        ON CONFLICT (query_key) DO UPDATE SET
+            fetched_page = excluded.fetched_page,
+            fetched_token = excluded.fetched_token,
+            fetched_count = checkpoints.fetched_count + excluded.fetched_count,
+            fetch_done = 0,
+            updated_at = excluded.updated_at
+        """, (query_key, page_number, next_token, job_count, self._now()))
+
+    def record_fetch_done(self, query_key):
+        self._execute("""
+        UPDATE checkpoints SET fetch_done = 1, updated_at = ? WHERE query_key = ?
+        """, (self._now(), query_key))
+
+    def record_loaded(self, pages):
+        # Advance the load watermark for every page in a committed batch in a
+        # single transaction. Pages of one query arrive in order, so the last
+        # one seen per query is the new watermark.
+        watermarks = {}
+        for page in pages:
+            current = watermarks.get(page['query'])
+            if not current or page['page_number'] > current['page_number']:
+                watermarks[page['query']] = page
+
+        now = self._now()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                for query_key, page in watermarks.items():
+                    self._conn.execute("""
+                    UPDATE checkpoints SET loaded_page = ?, loaded_token = ?, updated_at = ?
+                    WHERE query_key = ? AND loaded_page < ?
+                    """, (page['page_number'], page['next_token'], now, query_key, page['page_number']))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def record_all_fetched_loaded(self, query_keys):
+        # Batch mode loads whole chains at once, so the watermark jumps
+        # straight to the last fetched page. Only pass chains whose jobs all
+        # went into the committed load.
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                for query_key in query_keys:
+                    self._conn.execute("""
+                    UPDATE checkpoints SET loaded_page = fetched_page, loaded_token = fetched_token, updated_at = ?
+                    WHERE query_key = ?
+                    """, (self._now(), query_key))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def reset(self, query_key):
+        self._execute("DELETE FROM checkpoints WHERE query_key = ?", (query_key,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
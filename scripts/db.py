@@ -0,0 +1,93 @@
+import os
+import logging
+import threading
+
+import psycopg
+from psycopg_pool import ConnectionPool
+from dotenv import load_dotenv
+
+# DOTENV=off leaves the environment alone, so a harness can point the
+# pipeline at a throwaway database without .env overriding it
+DOTENV_ENABLED = os.getenv('DOTENV', 'on') != 'off'
+if DOTENV_ENABLED:
+    load_dotenv(override=True)
+
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '4'))
+# Idle connections older than this are closed, the pool refills on demand
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+# Server-side prepare a statement after it has run this many times on a
+# connection. Warm pooled connections keep their prepared statements, so the
+# per-batch merge and lookup queries skip planning after the first runs.
+DB_PREPARE_THRESHOLD = int(os.getenv('DB_PREPARE_THRESHOLD', '2'))
+# Schema search path for every connection, set at connect time so pooled
+# connections start with it and nothing persists on the role
+DB_SEARCH_PATH = os.getenv('DB_SEARCH_PATH')
+
+
+def connection_kwargs():
+    kwargs = {
+        'host': os.getenv('DB_HOST'),
+        'dbname': os.getenv('DB_NAME', 'jobs_db'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD'),
+        'port': int(os.getenv('DB_PORT', '5432')),
+        'sslmode': os.getenv('DB_SSLMODE', 'require'),
+        'connect_timeout': 10,
+        'prepare_threshold': DB_PREPARE_THRESHOLD
+    }
+    if DB_SEARCH_PATH:
+        kwargs['options'] = f"-c search_path={DB_SEARCH_PATH}"
+    return kwargs
+
+
+def connect_to_db():
+    # Single dedicated connection, for scripts that don't need the pool
+    try:
+        conn = psycopg.connect(**connection_kwargs())
+        print("Connection Successful")
+        return conn
+
+    except Exception as e:
+        print("Connection Failed", e)
+        logging.info(f"Connection Failed: {e}")
+        return None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # Process-wide pool, opened on first use. Connections are health checked
+    # when handed out, so a connection dropped by the server (or by an idle
+    # timeout on the network path) is replaced instead of failing a load.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                kwargs=connection_kwargs(),
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=max(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+                max_idle=DB_POOL_MAX_IDLE,
+                check=ConnectionPool.check_connection,
+                name='jobs_db',
+                open=False
+            )
+            _pool.open(wait=True, timeout=30)
+            logging.info(f"Opened connection pool ({DB_POOL_MIN_SIZE}-{DB_POOL_MAX_SIZE} connections)")
+        return _pool
+
+
+def pool_stats():
+    with _pool_lock:
+        return _pool.get_stats() if _pool else {}
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            logging.info(f"Closing connection pool: {_pool.get_stats()}")
+            _pool.close()
+            _pool = None
@@ -0,0 +1,314 @@
+import os
+import zlib
+import logging
+import argparse
+
+import numpy as np
+
+from db import get_pool, close_pool
+from metrics import metrics
+from skills import tokenize
+
+# MinHash signature length, LSH bands (rows per band = perms / bands) and
+# word shingle size. 128 perms in 16 bands of 8 make two postings with
+# Jaccard similarity 0.8 share a bucket with probability 0.94, and 0.5 only
+# with 0.06; candidates are then checked against DEDUP_THRESHOLD.
+DEDUP_NUM_PERM = int(os.getenv('DEDUP_NUM_PERM', '128'))
+DEDUP_BANDS = int(os.getenv('DEDUP_BANDS', '16'))
+DEDUP_SHINGLE_SIZE = int(os.getenv('DEDUP_SHINGLE_SIZE', '3'))
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.8'))
+
+# Fields a posting is compared on
+DEDUP_FIELDS = ['title', 'company_name', 'description']
+
+# Shingles per chunk when hashing: a (perms x shingles) uint64 matrix, 16 MB
+CHUNK_SHINGLES = 16384
+
+
+class MinHasher:
+    # MinHash signatures over word shingles of a document. Tokens are hashed
+    # with crc32 (stable across processes, unlike hash()), k consecutive
+    # token hashes are combined into a 32-bit shingle hash with numpy, and
+    # each of num_perm multiply-shift hashes (a*x + b mod 2^64) >> 32 keeps
+    # its minimum. uint64 arithmetic wraps for free, which is several times
+    # cheaper than the textbook mod-prime permutations. Many documents are
+    # hashed in one matrix operation and cut apart with minimum.reduceat, so
+    # the Python work is one pass over the tokens.
+
+    def __init__(self, num_perm=DEDUP_NUM_PERM, shingle_size=DEDUP_SHINGLE_SIZE, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        # Odd multipliers keep every hash a bijection of the shingle hash
+        self.a = (rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) << np.uint64(1) | np.uint64(1))[:, None]
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)[:, None]
+        self._token_hashes = {}
+
+    @property
+    def params(self):
+        # Stored next to each signature; a change forces recomputation
+        return f"minhash-ms:{self.num_perm}:{self.shingle_size}:{self.seed}"
+
+    def shingles(self, text):
+        # 32-bit hashes of the document's word k-shingles, empty for no words
+        cache = self._token_hashes
+        tokens = tokenize(text)
+        hashes = np.fromiter(
+            (cache[token] if token in cache else cache.setdefault(token, zlib.crc32(token.encode('utf-8')))
+             for token in tokens), dtype=np.uint64, count=len(tokens))
+        k = min(self.shingle_size, len(hashes))
+        if k == 0:
+            return hashes
+        combined = hashes[:len(hashes) - k + 1].copy()
+        for offset in range(1, k):
+            combined = combined * np.uint64(0x9E3779B1) + hashes[offset:len(hashes) - k + 1 + offset]
+        return combined & np.uint64(0xFFFFFFFF)
+
+    def signatures(self, texts):
+        # (len(texts), num_perm) uint32 signatures and a mask of the
+        # documents that had any words; empty ones get an all-zero row
+        signatures = np.zeros((len(texts), self.num_perm), dtype=np.uint32)
+        valid = np.zeros(len(texts), dtype=bool)
+
+        pending, owners = [], []
+        pending_size = 0
+
+        def flush():
+            nonlocal pending, owners, pending_size
+            if not pending:
+                return
+            values = np.concatenate(pending)
+            starts = np.cumsum([0] + [len(shingles) for shingles in pending[:-1]])
+            hashed = self.a * values[None, :]
+            hashed += self.b
+            hashed >>= np.uint64(32)
+            minima = np.minimum.reduceat(hashed, starts, axis=1)
+            signatures[owners] = minima.T.astype(np.uint32)
+            pending, owners, pending_size = [], [], 0
+
+        for index, text in enumerate(texts):
+            shingles = self.shingles(text or '')
+            if not len(shingles):
+                continue
+            valid[index] = True
+            pending.append(shingles)
+            owners.append(index)
+            pending_size += len(shingles)
+            if pending_size >= CHUNK_SHINGLES:
+                flush()
+        flush()
+        return signatures, valid
+
+
+def document_text(title, company_name, description):
+    return ' '.join(value for value in (title, company_name, description) if value)
+
+
+def candidate_pairs(signatures, bands=DEDUP_BANDS):
+    # LSH: documents whose signatures agree on every row of some band share
+    # a bucket. Each bucket member is paired with the bucket's first member
+    # rather than with every other member, so a large bucket costs linear,
+    # not quadratic, work; clustering connects the rest transitively.
+    count, num_perm = signatures.shape
+    rows = num_perm // bands
+    pairs = []
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows]).view(
+            np.dtype((np.void, rows * signatures.itemsize))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        leaders = first[inverse.ravel()]
+        members = np.flatnonzero(leaders != np.arange(count))
+        pairs.append(np.stack([leaders[members], members], axis=1))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def similarities(signatures, pairs, chunk=65536):
+    # Estimated Jaccard similarity per pair: the share of agreeing minima
+    result = np.empty(len(pairs), dtype=np.float32)
+    for start in range(0, len(pairs), chunk):
+        left = signatures[pairs[start:start + chunk, 0]]
+        right = signatures[pairs[start:start + chunk, 1]]
+        result[start:start + chunk] = (left == right).mean(axis=1)
+    return result
+
+
+def cluster(signatures, order_keys, bands=DEDUP_BANDS, threshold=DEDUP_THRESHOLD):
+    # Group near-duplicates. Returns (member, canonical, similarity) index
+    # triples for every document in a cluster of two or more, the canonical
+    # member included; the canonical one is the smallest order_key. Pairs
+    # that clear the threshold are joined with union-find.
+    pairs = candidate_pairs(signatures, bands)
+    if len(pairs):
+        pairs = pairs[similarities(signatures, pairs) >= threshold]
+
+    parent = {}
+
+    def find(node):
+        root = node
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while parent.get(node, node) != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for left, right in pairs.tolist():
+        left_root, right_root = find(left), find(right)
+        if left_root != right_root:
+            # Keep the root at the canonical member
+            if order_keys[right_root] < order_keys[left_root]:
+                left_root, right_root = right_root, left_root
+            parent[right_root] = left_root
+
+    members = np.array(sorted(parent), dtype=np.int64)
+    if not len(members):
+        return []
+    canonicals = np.array([find(member) for member in members.tolist()], dtype=np.int64)
+    roots = np.unique(canonicals)
+    members = np.concatenate([members, roots])
+    canonicals = np.concatenate([canonicals, roots])
+    scores = similarities(signatures, np.stack([members, canonicals], axis=1))
+    return list(zip(members.tolist(), canonicals.tolist(), scores.tolist()))
+
+
+def create_dedup_tables(conn):
+    with conn.cursor() as cursor:
+        # One MinHash signature per job, recomputed when the job's
+        # content_hash or the MinHash parameters change
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_signatures (
+            job_id VARCHAR(100) PRIMARY KEY,
+            content_hash CHAR(32),
+            params TEXT NOT NULL,
+            signature BYTEA NOT NULL
+        )
+        """)
+        # Near-duplicate clusters: every member of a cluster of two or more
+        # postings, the canonical one included, mapped to the canonical id
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_clusters (
+            job_id VARCHAR(100) PRIMARY KEY,
+            canonical_job_id VARCHAR(100) NOT NULL,
+            similarity REAL NOT NULL,
+            clustered_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS job_clusters_canonical_idx ON job_clusters (canonical_job_id)
+        """)
+    conn.commit()
+
+
+def refresh_signatures(conn, hasher, batch_rows=5000):
+    # Sign the jobs that are new, changed or signed with other parameters.
+    # Rows are streamed with a server-side cursor and the signatures COPYed
+    # into a staging table, then upserted in one statement.
+    fields = ', '.join(f"j.{field}" for field in DEDUP_FIELDS)
+    signed = 0
+    with conn.cursor() as cursor:
+        cursor.execute("""
+        CREATE TEMP TABLE job_signatures_stage (LIKE job_signatures) ON COMMIT DROP
+        """)
+        with conn.cursor(name='dedup_unsigned') as rows:
+            rows.execute(f"""
+            SELECT j.job_id, j.content_hash, {fields}
+            FROM jobs j
+            LEFT JOIN job_signatures s USING (job_id)
+            WHERE s.job_id IS NULL
+               OR s.content_hash IS DISTINCT FROM j.content_hash
+               OR s.params <> %s
+            """, (hasher.params,))
+            while True:
+                batch = rows.fetchmany(batch_rows)
+                if not batch:
+                    break
+                signatures, _ = hasher.signatures([document_text(*row[2:]) for row in batch])
+                with cursor.copy("COPY job_signatures_stage (job_id, content_hash, params, signature) FROM STDIN") as copy:
+                    for (job_id, content_hash, *_), signature in zip(batch, signatures):
+                        copy.write_row((job_id, content_hash, hasher.params, signature.tobytes()))
+                signed += len(batch)
+
+        cursor.execute("""
+        INSERT INTO job_signatures SELECT * FROM job_signatures_stage
+        ON CONFLICT (job_id) DO UPDATE SET
+            content_hash = EXCLUDED.content_hash, params = EXCLUDED.params, signature = EXCLUDED.signature
+        """)
+        # Jobs that no longer exist
+        cursor.execute("""
+        DELETE FROM job_signatures s WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.job_id = s.job_id)
+        """)
+    conn.commit()
+    return signed
+
+
+def rebuild_clusters(conn, hasher, bands=DEDUP_BANDS, threshold=DEDUP_THRESHOLD):
+    # Cluster every signed job and replace job_clusters in one transaction,
+    # so readers see either the old or the new clustering. The first seen
+    # posting of a cluster is its canonical one. first_seen_at never moves
+    # (unlike ingested_at, which every update bumps), so re-fetching the
+    # canonical posting does not hand the cluster to another member.
+    with conn.cursor() as cursor:
+        cursor.execute("""
+        SELECT s.job_id, s.signature, j.first_seen_at
+        FROM job_signatures s
+        JOIN jobs j USING (job_id)
+        WHERE s.params = %s
+        ORDER BY j.first_seen_at, s.job_id
+        """, (hasher.params,))
+        rows = cursor.fetchall()
+
+    job_ids = [job_id for job_id, _, _ in rows]
+    signatures = np.frombuffer(b''.join(bytes(signature) for _, signature, _ in rows),
+                               dtype=np.uint32).reshape(len(rows), hasher.num_perm)
+    # Rows come sorted, so the position is the canonical order. All-zero
+    # signatures belong to jobs without text and are left out.
+    keep = signatures.any(axis=1)
+    positions = np.flatnonzero(keep)
+    clusters = cluster(signatures[keep], positions, bands, threshold)
+
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM job_clusters")
+        with cursor.copy("COPY job_clusters (job_id, canonical_job_id, similarity) FROM STDIN") as copy:
+            for member, canonical, similarity in clusters:
+                copy.write_row((job_ids[positions[member]], job_ids[positions[canonical]], round(similarity, 4)))
+    conn.commit()
+
+    duplicates = sum(1 for member, canonical, _ in clusters if member != canonical)
+    return len(rows), len(clusters) - duplicates, duplicates
+
+
+def run_dedup(conn, hasher=None, threshold=DEDUP_THRESHOLD):
+    # Dedup stage: bring signatures up to date, then recluster everything.
+    # Signing only touches new and changed jobs; clustering is a few numpy
+    # passes over all signatures, near-linear in the number of jobs.
+    hasher = hasher or MinHasher()
+    create_dedup_tables(conn)
+    with metrics.timer('dedup'):
+        signed = refresh_signatures(conn, hasher)
+        jobs, clusters, duplicates = rebuild_clusters(conn, hasher, threshold=threshold)
+    metrics.inc('pipeline_jobs_signed_total', signed)
+
+    summary = f"Dedup: signed {signed} jobs, {duplicates} near-duplicates in {clusters} clusters out of {jobs} jobs"
+    print(summary)
+    logging.info(summary, extra={
+        'event': 'dedup', 'signed': signed, 'jobs': jobs, 'clusters': clusters, 'duplicates': duplicates
+    })
+    return clusters, duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cluster near-duplicate postings into job_clusters')
+    parser.add_argument('--threshold', type=float, default=DEDUP_THRESHOLD)
+    args = parser.parse_args()
+
+    try:
+        with get_pool().connection() as conn:
+            run_dedup(conn, threshold=args.threshold)
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Hard ceiling on simultaneous SerpAPI requests, however many workers are asked for
+FETCH_CONCURRENCY_CAP = int(os.getenv('FETCH_CONCURRENCY_CAP', '8'))
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', '4'))
+
+# Pushed onto the page queue once every producer has finished
+PAGES_DONE = object()
+
+
+def resolve_worker_count(requested, chain_count, cap=FETCH_CONCURRENCY_CAP):
+    # Never more threads than chains to run, never more than the cap
+    return max(1, min(requested, cap, chain_count))
+
+
+def iter_query_pages(spec, fetch_page, start_token=None, start_page=1, is_known=None):
+    # Follow one query's next_page_token chain, yielding each page as soon as
+    # it arrives. The token lives in this generator's locals, so chains never
+    # share pagination state. start_page keeps page numbers stable when a
+    # chain resumes from a checkpoint.
+    #
+    # Incremental crawl: with is_known (page jobs -> True if every job is
+    # already stored) the chain ends once spec['stop_after_known_pages']
+    # consecutive pages were fully known. Results are newest first, so past
+    # that point there is nothing new left to find.
+    query = spec['key']
+    token = start_token
+    page_count = start_page - 1
+    stop_after = spec.get('stop_after_known_pages', 0) if is_known else 0
+    known_streak = 0
+
+    while True:
+        page_count += 1
+        logging.info(f"[{query}] PAGE {page_count}, starting with token: {token}")
+
+        page_jobs, next_token = fetch_page(spec, token)
+
+        logging.info(f"[{query}] Got {len(page_jobs)} jobs, next token: {next_token}")
+
+        if not page_jobs:
+            logging.info(f"[{query}] No jobs found, ending chain")
+            return
+
+        yield {
+            'query': query,
+            'page_number': page_count,
+            'jobs': page_jobs,
+            'next_token': next_token
+        }
+
+        if not next_token:
+            logging.info(f"[{query}] No next token, ending chain")
+            return
+
+        if stop_after:
+            known_streak = known_streak + 1 if is_known(page_jobs) else 0
+            if known_streak >= stop_after:
+                logging.info(f"[{query}] {known_streak} consecutive pages of known jobs, ending chain early")
+                return
+
+        token = next_token
+
+
+def fetch_query_chain(spec, fetch_page, start_point=(None, 1), on_page=None, on_chain_done=None,
+                      is_known=None):
+    chain_jobs = []
+    for page in iter_query_pages(spec, fetch_page, *start_point, is_known=is_known):
+        chain_jobs.extend(page['jobs'])
+        if on_page:
+            on_page(page)
+
+    if on_chain_done:
+        on_chain_done(spec['key'])
+    return chain_jobs
+
+
+def fetch_all_queries(queries, fetch_page, workers=FETCH_WORKERS, start_points=None, on_page=None,
+                      on_chain_done=None, is_known=None):
+    # Run every search spec's pagination chain on a bounded thread pool.
+    # Specs are submitted in list order, so callers pass them sorted by
+    # priority. Pages within a chain stay sequential (each needs the previous
+    # token) but independent chains overlap, so wall time approaches the
+    # slowest chain instead of the sum of all of them.
+    start_points = start_points or {}
+    worker_count = resolve_worker_count(workers, len(queries))
+    logging.info(f"Fetching {len(queries)} queries with {worker_count} workers")
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='fetch') as pool:
+        futures = {
+            pool.submit(fetch_query_chain, spec, fetch_page, start_points.get(spec['key'], (None, 1)),
+                        on_page, on_chain_done, is_known): spec['key']
+            for spec in queries
+        }
+
+        for future in as_completed(futures):
+            query = futures[future]
+            try:
+                results[query] = future.result()
+            except Exception as e:
+                # One failing chain should not take the others down with it.
+                # It is left out of results: the pages it did fetch are
+                # dropped, so the caller must not count them as loaded.
+                print(f"Fetching query '{query}' failed: {e}")
+                logging.info(f"Fetching query '{query}' failed: {e}")
+
+    return results
+
+
+def _put_page(page_queue, page, stop):
+    # Blocking put so a slow writer applies backpressure to the fetchers, but
+    # wake up regularly in case the writer has gone away
+    while not stop.is_set():
+        try:
+            page_queue.put(page, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce_chain(spec, fetch_page, start_point, page_queue, stop, on_page, on_chain_done, is_known):
+    for page in iter_query_pages(spec, fetch_page, *start_point, is_known=is_known):
+        if on_page:
+            on_page(page)
+        if not _put_page(page_queue, page, stop):
+            return
+
+    if on_chain_done:
+        on_chain_done(spec['key'])
+
+
+def stream_pages(queries, fetch_page, page_queue, workers=FETCH_WORKERS, start_points=None,
+                 on_page=None, on_chain_done=None, stop=None, is_known=None):
+    # Producer side of the streaming pipeline. Runs the pagination chains on a
+    # bounded pool in a background thread and feeds every page into page_queue,
+    # then pushes PAGES_DONE. Returns the thread and the stop event the writer
+    # sets if it bails out early.
+    start_points = start_points or {}
+    stop = stop or threading.Event()
+    worker_count = resolve_worker_count(workers, len(queries))
+    logging.info(f"Streaming {len(queries)} queries with {worker_count} workers")
+
+    def run():
+        try:
+            with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='fetch') as pool:
+                futures = {
+                    pool.submit(_produce_chain, spec, fetch_page, start_points.get(spec['key'], (None, 1)),
+                                page_queue, stop, on_page, on_chain_done, is_known): spec['key']
+                    for spec in queries
+                }
+
+                for future in as_completed(futures):
+                    query = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Fetching query '{query}' failed: {e}")
+                        logging.info(f"Fetching query '{query}' failed: {e}")
+        finally:
+            _put_page(page_queue, PAGES_DONE, stop)
+
+    producer = threading.Thread(target=run, name='fetch-producer', daemon=True)
+    producer.start()
+    return producer, stop
@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import uuid
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from db import connect_to_db, get_pool, close_pool
+from loader import create_job_table, bulk_insert_into_job_table, parallel_bulk_insert
+from normalize import normalize_jobs_table, add_load_metadata
+from skills import add_skills
+
+LANDING_DIR = os.getenv('LANDING_DIR', os.path.join('landing', 'jobs'))
+LANDING_COMPRESSION = os.getenv('LANDING_COMPRESSION', 'zstd')
+# Partitions with at least this many small files get compacted
+COMPACT_MIN_FILES = int(os.getenv('COMPACT_MIN_FILES', '8'))
+COMPACT_SMALL_FILE_BYTES = int(os.getenv('COMPACT_SMALL_FILE_MB', '16')) * 1024 * 1024
+
+LANDING_SCHEMA = pa.schema([
+    ('job_id', pa.string()),
+    ('query_key', pa.string()),
+    ('page_number', pa.int32()),
+    ('run_id', pa.string()),
+    ('fetched_at', pa.timestamp('us', tz='UTC')),
+    ('raw_json', pa.string())
+])
+
+PARTITION_SCHEMA = pa.schema([('ingest_date', pa.string()), ('query', pa.string())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+
+
+def query_slug(query_key):
+    # Directory-safe, still readable, and unique thanks to the hash suffix
+    slug = re.sub(r'[^a-z0-9]+', '-', query_key.lower()).strip('-')[:60]
+    digest = hashlib.sha1(query_key.encode('utf-8')).hexdigest()[:8]
+    return f"{slug}-{digest}"
+
+
+def _write_atomic(table, path):
+    # Dot-prefixed temp file: dataset discovery skips it if we crash mid-write
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(table, tmp_path, compression=LANDING_COMPRESSION)
+    os.replace(tmp_path, path)
+
+
+def land_page(page, run_id, landing_dir=LANDING_DIR):
+    # Write one page of raw API jobs as its own Parquet file under
+    # ingest_date=YYYY-MM-DD/query=<slug>/. The untouched job JSON is kept so
+    # fields can be re-derived later without paying for the API again.
+    fetched_at = datetime.now(timezone.utc)
+    jobs = page['jobs']
+
+    table = pa.table({
+        'job_id': [job.get('job_id') for job in jobs],
+        'query_key': [page['query']] * len(jobs),
+        'page_number': [page['page_number']] * len(jobs),
+        'run_id': [run_id] * len(jobs),
+        'fetched_at': [fetched_at] * len(jobs),
+        'raw_json': [json.dumps(job, separators=(',', ':')) for job in jobs]
+    }, schema=LANDING_SCHEMA)
+
+    partition = os.path.join(
+        landing_dir,
+        f"ingest_date={fetched_at.date().isoformat()}",
+        f"query={query_slug(page['query'])}"
+    )
+    os.makedirs(partition, exist_ok=True)
+
+    path = os.path.join(partition, f"part-{run_id}-{page['page_number']:05d}-{uuid.uuid4().hex[:8]}.parquet")
+    _write_atomic(table, path)
+    return path
+
+
+def compact_partition(partition, min_files=COMPACT_MIN_FILES, small_file_bytes=COMPACT_SMALL_FILE_BYTES):
+    # Merge the small files of one partition into a single file. The merged
+    # file is renamed into place before the inputs are removed, so a crash
+    # can leave duplicates behind (harmless, loads dedup on job_id) but never
+    # loses rows.
+    small_files = sorted(
+        os.path.join(partition, name) for name in os.listdir(partition)
+        if name.endswith('.parquet') and os.path.getsize(os.path.join(partition, name)) < small_file_bytes
+    )
+    if len(small_files) < min_files:
+        return 0
+
+    table = pa.concat_tables(pq.read_table(path, schema=LANDING_SCHEMA) for path in small_files)
+    table = table.sort_by([('fetched_at', 'ascending'), ('page_number', 'ascending')])
+
+    merged_path = os.path.join(partition, f"compacted-{uuid.uuid4().hex[:12]}.parquet")
+    _write_atomic(table, merged_path)
+
+    for path in small_files:
+        os.remove(path)
+
+    logging.info(f"Compacted {len(small_files)} files into {merged_path}")
+    return len(small_files)
+
+
+def compact_landing(landing_dir=LANDING_DIR, include_today=False):
+    # Incremental: only partitions that have piled up enough small files are
+    # rewritten. Today's partitions are still being written to, so they are
+    # left alone unless asked. Today in UTC, the day land_page names them by.
+    today = f"ingest_date={datetime.now(timezone.utc).date().isoformat()}"
+    compacted = 0
+
+    if not os.path.isdir(landing_dir):
+        return compacted
+
+    for date_dir in sorted(os.listdir(landing_dir)):
+        if date_dir == today and not include_today:
+            continue
+        date_path = os.path.join(landing_dir, date_dir)
+        if not os.path.isdir(date_path):
+            continue
+        for query_dir in sorted(os.listdir(date_path)):
+            query_path = os.path.join(date_path, query_dir)
+            if os.path.isdir(query_path):
+                compacted += compact_partition(query_path)
+
+    logging.info(f"Compacted {compacted} small files")
+    return compacted
+
+
+def landing_dataset(landing_dir=LANDING_DIR):
+    schema = pa.unify_schemas([LANDING_SCHEMA, PARTITION_SCHEMA])
+    return ds.dataset(landing_dir, format='parquet', schema=schema, partitioning=PARTITIONING)
+
+
+def replay_landing(conn, since=None, until=None, landing_dir=LANDING_DIR, batch_rows=50000, workers=1):
+    # Rebuild jobs from the landing zone instead of the API: scan the
+    # requested ingest dates, re-normalise the raw JSON and COPY it in with
+    # the bulk loader a batch at a time. Rows keep the run and search that
+    # originally fetched them, and posting ages ("3 days ago") are resolved
+    # against the time the page was fetched, not the replay. With workers > 1
+    # every batch is COPYed over that many pooled connections in parallel
+    # before a single merge.
+    dataset = landing_dataset(landing_dir)
+
+    condition = None
+    if since:
+        condition = ds.field('ingest_date') >= since
+    if until:
+        upper = ds.field('ingest_date') <= until
+        condition = upper if condition is None else condition & upper
+
+    create_job_table(conn)
+
+    total_inserted = 0
+    total_skipped = 0
+    columns = ['raw_json', 'run_id', 'query_key', 'fetched_at']
+    for batch in dataset.to_batches(columns=columns, filter=condition, batch_size=batch_rows):
+        # Fetch order, so a job landed more than once is merged as its
+        # latest version
+        batch = pa.Table.from_batches([batch]).sort_by('fetched_at')
+        jobs = [json.loads(raw) for raw in batch.column('raw_json').to_pylist()]
+        normalized = normalize_jobs_table(jobs, batch.column('fetched_at').to_pylist())
+        table = add_skills(add_load_metadata(normalized, batch.column('run_id').to_pylist(),
+                                             batch.column('query_key').to_pylist()))
+        if workers > 1:
+            inserted, skipped = parallel_bulk_insert(conn, table, get_pool(), workers)
+        else:
+            inserted, skipped = bulk_insert_into_job_table(conn, table)
+        total_inserted += inserted
+        total_skipped += skipped
+
+    logging.info(f"Replay: {total_inserted} inserted, {total_skipped} skipped")
+    return total_inserted, total_skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain and replay the raw Parquet landing zone')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compact = subparsers.add_parser('compact', help='merge small landing files')
+    compact.add_argument('--include-today', action='store_true')
+
+    replay = subparsers.add_parser('replay', help='reload raw.jobs from landed pages')
+    replay.add_argument('--since', help='first ingest date, YYYY-MM-DD')
+    replay.add_argument('--until', help='last ingest date, YYYY-MM-DD')
+    replay.add_argument('--workers', type=int, default=1,
+                        help='parallel COPY connections per batch (keep DB_POOL_MAX_SIZE >= workers)')
+
+    args = parser.parse_args()
+
+    # The functions only log; the summary goes to the console here
+    if args.command == 'compact':
+        print(f"Compacted {compact_landing(include_today=args.include_today)} small files")
+        return
+
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to db")
+        return
+
+    try:
+        inserted, skipped = replay_landing(conn, since=args.since, until=args.until, workers=args.workers)
+        print(f"Replay: {inserted} inserted, {skipped} skipped")
+    finally:
+        conn.close()
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
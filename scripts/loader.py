@@ -0,0 +1,994 @@
+import io
+import os
+import json
+import time
+import uuid
+import zlib
+import queue
+import logging
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import psycopg
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+from fetcher import PAGES_DONE
+from metrics import metrics
+
+# Highlight sections as lists, one element per bullet as SerpAPI returns
+# them. The comma-joined text columns are kept for full-text search and
+# existing readers, but bullets often contain commas themselves, so only the
+# lists can be split back reliably.
+HIGHLIGHT_ITEM_COLUMNS = [
+    'qualification_items',
+    'benefit_items',
+    'responsibility_items'
+]
+
+# Column order shared by the row-by-row insert, the COPY stream and the merge
+JOB_COLUMNS = [
+    'job_id',
+    'title',
+    'location',
+    'company_name',
+    'description',
+    'qualifications',
+    'benefits',
+    'responsibilities',
+    'posted_at',
+    'posted_at_ts',
+    'schedule_type',
+    'dental_coverage',
+    'health_coverage'
+] + HIGHLIGHT_ITEM_COLUMNS
+
+# Ingestion metadata written alongside every job: which run and search
+# loaded it and a hash of its normalised content
+METADATA_COLUMNS = [
+    'run_id',
+    'query',
+    'content_hash'
+]
+
+LOAD_COLUMNS = JOB_COLUMNS + METADATA_COLUMNS
+
+# posted_at resolved against the fetch time. jobs is range-partitioned on it,
+# one partition per posting month, so it is NOT NULL, part of the primary
+# key, and keeps its first value when a job is updated: rows never move
+# between partitions.
+PARTITION_COLUMN = 'posted_at_ts'
+
+# Columns that change between fetches of the same posting: posted_at is an
+# age ("3 days ago") and posted_at_ts is derived from it and the fetch time.
+# They are not part of content_hash and not compared for job_changes, so a
+# re-seen job is only rewritten when its content changed.
+VOLATILE_COLUMNS = ['posted_at', PARTITION_COLUMN]
+
+# VARCHAR/CHAR limits of the jobs columns, values are cut to fit before writing
+COLUMN_LIMITS = {
+    'job_id': 100,
+    'title': 100,
+    'location': 100,
+    'company_name': 100,
+    'description': 5000,
+    'qualifications': 5000,
+    'benefits': 5000,
+    'responsibilities': 5000,
+    'posted_at': 100,
+    'schedule_type': 100,
+    'dental_coverage': 100,
+    'health_coverage': 100,
+    'run_id': 64,
+    'query': 500,
+    'content_hash': 32
+}
+
+# Arrow type of every column the loaders write; TEXT[] columns are lists
+COLUMN_TYPES = {
+    column: pa.list_(pa.string()) if column in HIGHLIGHT_ITEM_COLUMNS else pa.string()
+    for column in LOAD_COLUMNS
+}
+COLUMN_TYPES[PARTITION_COLUMN] = pa.timestamp('us', tz='UTC')
+
+# Row-level failures worth isolating. Anything else (lost connection, missing
+# table) fails the whole batch.
+ROW_ERRORS = (psycopg.DataError, psycopg.IntegrityError)
+
+ON_CONFLICT_MODES = ('changed', 'nothing', 'update')
+
+# Text search configuration for jobs.search_vector
+SEARCH_CONFIG = 'english'
+SEARCH_VECTOR_SQL = "job_search_vector(title, qualifications, responsibilities, description)"
+
+# Position of every row in its batch, in fetch order. It is staged next to
+# the row so that when a job_id repeats (several pages, landing replays) the
+# merge keeps the most recently fetched version rather than an arbitrary one.
+BATCH_ROW_COLUMN = 'batch_row'
+
+# Connections used by parallel_bulk_insert, each COPYs one partition
+LOAD_WORKERS = int(os.getenv('LOAD_WORKERS', '4'))
+
+
+# Held for the whole merge transaction. jobs is partitioned, so its primary
+# key has to include posted_at_ts and cannot by itself stop two concurrent
+# loads from inserting the same job_id into different partitions.
+JOBS_MERGE_LOCK = 0x6a6f6273
+
+JOBS_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id VARCHAR(100) NOT NULL,
+    title VARCHAR(100),
+    location VARCHAR(100),
+    company_name VARCHAR(100),
+    description VARCHAR(5000),
+    qualifications VARCHAR(5000),
+    benefits VARCHAR(5000),
+    responsibilities VARCHAR(5000),
+    posted_at VARCHAR(100),
+    posted_at_ts TIMESTAMPTZ NOT NULL,
+    schedule_type VARCHAR(100),
+    dental_coverage VARCHAR(100),
+    health_coverage VARCHAR(100),
+    qualification_items TEXT[],
+    benefit_items TEXT[],
+    responsibility_items TEXT[],
+    ingested_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    first_seen_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    run_id VARCHAR(64),
+    query VARCHAR(500),
+    content_hash CHAR(32),
+    search_vector TSVECTOR,
+    PRIMARY KEY (job_id, posted_at_ts)
+) PARTITION BY RANGE (posted_at_ts)
+"""
+
+
+def create_job_table(conn):
+    cursor = conn.cursor()
+
+    # Full-text search over the posting. Computed by the loaders in the same
+    # statement that writes the row, indexed with GIN for keyword lookups.
+    cursor.execute(f"""
+    CREATE OR REPLACE FUNCTION job_search_vector(
+        title TEXT, qualifications TEXT, responsibilities TEXT, description TEXT
+    ) RETURNS TSVECTOR LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A')
+            || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(qualifications, '')), 'B')
+            || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(responsibilities, '')), 'C')
+            || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'D')
+    $$
+    """)
+
+    # SQL twin of normalize.resolve_posted_at, for rows that only have the
+    # relative string, e.g. when migrating an unpartitioned table
+    cursor.execute(r"""
+    CREATE OR REPLACE FUNCTION job_posted_at(posted_at TEXT, fetched_at TIMESTAMPTZ)
+    RETURNS TIMESTAMPTZ LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT coalesce(
+            fetched_at - (
+                SELECT age[1]::int * CASE age[2]
+                    WHEN 'minute' THEN interval '1 minute'
+                    WHEN 'hour' THEN interval '1 hour'
+                    WHEN 'day' THEN interval '1 day'
+                    WHEN 'week' THEN interval '7 days'
+                    WHEN 'month' THEN interval '30 days'
+                    WHEN 'year' THEN interval '365 days'
+                END
+                FROM regexp_match(lower(posted_at), '(\d{1,4})\+?\s*(minute|hour|day|week|month|year)s?\s+ago') age
+            ),
+            CASE WHEN lower(posted_at) LIKE '%yesterday%' THEN fetched_at - interval '1 day' END,
+            fetched_at
+        )
+    $$
+    """)
+
+    # Monthly partitions (jobs_pYYYYMM, UTC months) are created on demand by
+    # the loaders, one call per month in the batch
+    cursor.execute("""
+    CREATE OR REPLACE FUNCTION create_job_partition(posted TIMESTAMPTZ) RETURNS TEXT LANGUAGE plpgsql AS $$
+    DECLARE
+        first_day DATE := date_trunc('month', posted AT TIME ZONE 'UTC')::date;
+        partition_name TEXT := 'jobs_p' || to_char(first_day, 'YYYYMM');
+    BEGIN
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF jobs FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, first_day::timestamp AT TIME ZONE 'UTC',
+                           (first_day + interval '1 month')::timestamp AT TIME ZONE 'UTC');
+        END IF;
+        RETURN partition_name;
+    END
+    $$
+    """)
+
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('jobs')")
+    existing = cursor.fetchone()
+    if existing is None:
+        cursor.execute(JOBS_TABLE_DDL)
+
+    # Tables created before the columns existed. ingested_at is the load
+    # watermark the incremental dbt models filter on and moves with every
+    # update; first_seen_at is set on insert and never changes. Rows older
+    # than first_seen_at all get the time it was added. ALTER TABLE takes
+    # ACCESS EXCLUSIVE on jobs and every partition even when IF NOT EXISTS
+    # makes it a no-op, so only for columns that are actually missing.
+    added_columns = {
+        'ingested_at': 'TIMESTAMPTZ NOT NULL DEFAULT now()',
+        'first_seen_at': 'TIMESTAMPTZ NOT NULL DEFAULT now()',
+        'run_id': 'VARCHAR(64)',
+        'query': 'VARCHAR(500)',
+        'content_hash': 'CHAR(32)',
+        'search_vector': 'TSVECTOR',
+        'qualification_items': 'TEXT[]',
+        'benefit_items': 'TEXT[]',
+        'responsibility_items': 'TEXT[]',
+    }
+    cursor.execute("""
+    SELECT column_name FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'jobs'
+    """)
+    present = {name for name, in cursor.fetchall()}
+    missing = [column for column in added_columns if column not in present]
+    if missing:
+        cursor.execute("ALTER TABLE jobs " + ", ".join(
+            f"ADD COLUMN IF NOT EXISTS {column} {added_columns[column]}" for column in missing))
+
+    # benefits used to be cut at 500 characters. Widening a VARCHAR only
+    # touches the catalog, but it still takes a lock, so only when needed.
+    cursor.execute("""
+    DO $$
+    BEGIN
+        IF (SELECT character_maximum_length FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'jobs'
+              AND column_name = 'benefits') < 5000 THEN
+            ALTER TABLE jobs ALTER COLUMN benefits TYPE VARCHAR(5000);
+        END IF;
+    END
+    $$
+    """)
+
+    if existing is not None and existing[0] != 'p':
+        migrate_jobs_table(cursor)
+
+    # This month and the next exist before any load needs them
+    cursor.execute("""
+    SELECT create_job_partition(now()), create_job_partition(now() + interval '1 month')
+    """)
+
+    # Postings by individual bullet: WHERE qualification_items @> ARRAY[...]
+    for column in HIGHLIGHT_ITEM_COLUMNS:
+        cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS jobs_{column}_gin ON jobs USING gin ({column})
+        """)
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS jobs_search_vector_gin ON jobs USING gin (search_vector)
+    """)
+
+    # "What changed since ..." lookups. Merges bump ingested_at and every
+    # ingest spreads over the posting months' partitions, so the column is
+    # not in physical order and a BRIN index would match most of the table.
+    # The dbt watermark filters on ingested_at alone, which the composite
+    # index cannot serve; that one is for per-search watermarks.
+    cursor.execute("""
+    DROP INDEX IF EXISTS jobs_ingested_at_brin
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS jobs_ingested_at_idx ON jobs (ingested_at)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS jobs_query_ingested_at_idx ON jobs (query, ingested_at)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS jobs_run_id_idx ON jobs (run_id)
+    """)
+    # Recency queries prune to the matching partitions, this orders within them
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS jobs_posted_at_ts_idx ON jobs (posted_at_ts)
+    """)
+
+    # One row per real content change of an already loaded job: which
+    # fields changed and the hashes either side, not the full old row
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS job_changes (
+        job_id VARCHAR(100) NOT NULL,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        run_id VARCHAR(64),
+        old_hash CHAR(32),
+        new_hash CHAR(32),
+        changed_columns TEXT[] NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS job_changes_job_id_idx ON job_changes (job_id, changed_at)
+    """)
+
+    # Rows that failed validation or were rejected by Postgres, kept with
+    # the reason so they can be inspected and replayed
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS job_dead_letters (
+        job_id TEXT,
+        run_id VARCHAR(64),
+        query VARCHAR(500),
+        reason TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        failed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """)
+
+    # Skills found in each job by the extraction stage (skills.py), rewritten
+    # whenever the job itself is inserted or updated
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS job_skills (
+        job_id VARCHAR(100) NOT NULL,
+        skill TEXT NOT NULL,
+        mentions INTEGER NOT NULL,
+        extracted_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (job_id, skill)
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS job_skills_skill_idx ON job_skills (skill)
+    """)
+    conn.commit()
+    cursor.close()
+
+
+def migrate_jobs_table(cursor):
+    # One-off move of a jobs table created before partitioning, inside the
+    # caller's transaction. The old table and its indexes are renamed with an
+    # _unpartitioned suffix and kept as a backup: drop jobs_unpartitioned by
+    # hand once the new table checks out. Rows get posted_at_ts from their
+    # posted_at string against the time they were first loaded.
+    cursor.execute("ALTER TABLE jobs RENAME TO jobs_unpartitioned")
+    cursor.execute("""
+    DO $$
+    DECLARE
+        index_name TEXT;
+    BEGIN
+        FOR index_name IN
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'jobs_unpartitioned'::regclass
+        LOOP
+            EXECUTE format('ALTER INDEX %I RENAME TO %I', index_name, left(index_name, 48) || '_unpartitioned');
+        END LOOP;
+    END
+    $$
+    """)
+    cursor.execute(JOBS_TABLE_DDL)
+
+    cursor.execute("""
+    SELECT create_job_partition(min(posted))
+    FROM (SELECT job_posted_at(posted_at, ingested_at) AS posted FROM jobs_unpartitioned) old
+    GROUP BY date_trunc('month', posted AT TIME ZONE 'UTC')
+    """)
+    partitions = cursor.rowcount
+
+    columns = ', '.join(
+        [column for column in LOAD_COLUMNS if column != PARTITION_COLUMN] + ['ingested_at', 'first_seen_at', 'search_vector'])
+    cursor.execute(f"""
+    INSERT INTO jobs ({columns}, {PARTITION_COLUMN})
+    SELECT {columns}, job_posted_at(posted_at, ingested_at)
+    FROM jobs_unpartitioned
+    """)
+    print(f"Migrated {cursor.rowcount} jobs into {partitions} monthly partitions")
+    logging.info(f"Migrated {cursor.rowcount} jobs into {partitions} monthly partitions", extra={
+        'event': 'partition_migrate', 'rows': cursor.rowcount, 'partitions': partitions})
+
+
+def create_job_partitions(cursor, stage_source):
+    # Create the monthly partitions a staged batch needs. Runs under the
+    # merge lock, so concurrent loads never race to create the same one.
+    metrics.inc('pipeline_db_round_trips_total')
+    cursor.execute(f"""
+    SELECT create_job_partition(min({PARTITION_COLUMN}))
+    FROM {stage_source}
+    GROUP BY date_trunc('month', {PARTITION_COLUMN} AT TIME ZONE 'UTC')
+    """)
+
+
+def _as_text(value):
+    # Postgres casts JSON booleans to 'true'/'false' on the row-by-row INSERT
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _map_items(values, fn):
+    # Apply a string kernel to every element of a list column, keeping the
+    # list boundaries and null lists
+    values = values.combine_chunks() if isinstance(values, pa.ChunkedArray) else values
+    offsets = pc.subtract(values.offsets, values.offsets[0])
+    return pa.ListArray.from_arrays(offsets, fn(values.flatten()), mask=values.is_null())
+
+
+def pg_array_literals(values):
+    # A list<string> column as Postgres array literals for the CSV COPY:
+    # every element quoted with \ and " escaped, null elements as NULL
+    def quote(items):
+        escaped = pc.replace_substring(pc.replace_substring(items, '\\', '\\\\'), '"', '\\"')
+        return pc.fill_null(pc.binary_join_element_wise('"', escaped, '"', ''), 'NULL')
+    quoted = _map_items(values, quote)
+    return pc.binary_join_element_wise('{', pc.binary_join(quoted, ','), '}', '')
+
+
+def validate_jobs(all_jobs):
+    # Make a batch safe to write: strip NUL characters (Postgres text cannot
+    # hold them) and cut every value to its column's limit. Rows without a
+    # usable job_id cannot be keyed and are rejected rather than coerced.
+    # Returns the clean Arrow table, numbered in BATCH_ROW_COLUMN, and a list
+    # of (row, reason) rejects.
+    if isinstance(all_jobs, pa.Table):
+        table = all_jobs
+    else:
+        table = pa.table({
+            column: pa.array([_as_text(job.get(column)) if COLUMN_TYPES[column] == pa.string() else job.get(column)
+                              for job in all_jobs], COLUMN_TYPES[column])
+            for column in LOAD_COLUMNS
+        })
+
+    if table.num_rows == 0:
+        return table, []
+
+    # The partition key cannot be NULL. Jobs normalised without it are
+    # placed by the time they are loaded.
+    now = pa.scalar(datetime.now(timezone.utc), COLUMN_TYPES[PARTITION_COLUMN])
+    if PARTITION_COLUMN in table.column_names:
+        table = table.set_column(table.column_names.index(PARTITION_COLUMN), PARTITION_COLUMN,
+                                 pc.fill_null(table[PARTITION_COLUMN], now))
+    else:
+        table = table.append_column(PARTITION_COLUMN, pa.array([now.as_py()] * table.num_rows, now.type))
+
+    truncated = {}
+    for column, limit in COLUMN_LIMITS.items():
+        if column not in table.column_names or column == 'job_id':
+            continue
+        values = pc.replace_substring(table[column], '\x00', '')
+        too_long = int(pc.sum(pc.greater(pc.utf8_length(values), limit)).as_py() or 0)
+        if too_long:
+            values = pc.utf8_slice_codeunits(values, 0, limit)
+            truncated[column] = too_long
+        table = table.set_column(table.column_names.index(column), column, values)
+
+    # Bullets have no length limit, only NULs to strip
+    for column in HIGHLIGHT_ITEM_COLUMNS:
+        if column in table.column_names:
+            values = _map_items(table[column], lambda items: pc.replace_substring(items, '\x00', ''))
+            table = table.set_column(table.column_names.index(column), column, values)
+
+    job_ids = table['job_id']
+    reasons = [
+        ('missing job_id', pc.or_kleene(pc.is_null(job_ids), pc.equal(job_ids, ''))),
+        ('job_id contains NUL', pc.match_substring(job_ids, '\x00')),
+        (f"job_id longer than {COLUMN_LIMITS['job_id']}", pc.greater(pc.utf8_length(job_ids), COLUMN_LIMITS['job_id']))
+    ]
+
+    rejects = []
+    keep = pa.array(np.ones(table.num_rows, dtype=bool))
+    for reason, mask in reasons:
+        mask = pc.and_(pc.fill_null(mask, True), keep)
+        rejects.extend((row, reason) for row in table.filter(mask).to_pylist())
+        keep = pc.and_(keep, pc.invert(mask))
+
+    if truncated:
+        logging.info(f"Truncated values to column limits: {truncated}", extra={
+            'event': 'validate', 'truncated': truncated})
+        for column, count in truncated.items():
+            metrics.inc('pipeline_values_truncated_total', count, column=column)
+
+    table = table.filter(keep) if rejects else table
+    table = table.append_column(BATCH_ROW_COLUMN, pa.array(np.arange(table.num_rows), pa.int64()))
+    return table, rejects
+
+
+def write_dead_letters(cursor, rejects):
+    # Park rejected rows in job_dead_letters inside the caller's transaction
+    if not rejects:
+        return 0
+
+    # executemany pipelines the inserts, one round trip for the lot
+    metrics.inc('pipeline_db_round_trips_total')
+    cursor.executemany("""
+    INSERT INTO job_dead_letters (job_id, run_id, query, reason, payload)
+    VALUES (%s, %s, %s, %s, %s)
+    """, [
+        ((row.get('job_id') or '').replace('\x00', '') or None, row.get('run_id'), row.get('query'),
+         reason.replace('\x00', ''), json.dumps(row, default=str))
+        for row, reason in rejects
+    ])
+    metrics.inc('pipeline_rows_loaded_total', len(rejects), outcome='dead_letter')
+    logging.info(f"Dead-lettered {len(rejects)} jobs", extra={
+        'event': 'dead_letter', 'count': len(rejects),
+        'samples': [f"{row.get('job_id')}: {reason}" for row, reason in rejects[:5]]
+    })
+    return len(rejects)
+
+
+def insert_into_job_table(conn, all_jobs):
+    # Original check-then-insert path, one statement pair per job. Each
+    # insert runs in its own savepoint, so a failing row is dead-lettered
+    # without discarding the rows inserted before it.
+    table, rejects = validate_jobs(all_jobs)
+
+    cursor = conn.cursor()
+
+    insert_query = f"""
+    INSERT INTO
+    jobs ({', '.join(LOAD_COLUMNS)}, search_vector)
+    VALUES ({', '.join(['%s'] * len(LOAD_COLUMNS))}, job_search_vector(%s, %s, %s, %s))
+    """
+
+    check_query = """ SELECT job_id FROM jobs WHERE job_id = %s"""
+
+    skip_count = 0
+    insert_count = 0
+    round_trips = 2
+    start = time.perf_counter()
+    # The check below is only safe while no other load can insert the same
+    # job_id into another partition
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (JOBS_MERGE_LOCK,))
+    cursor.execute(f"""
+    SELECT create_job_partition(min(posted))
+    FROM unnest(%s::timestamptz[]) posted
+    GROUP BY date_trunc('month', posted AT TIME ZONE 'UTC')
+    """, (table[PARTITION_COLUMN].to_pylist(),))
+    for job in table.to_pylist():
+        round_trips += 1
+        cursor.execute(check_query, (job.get('job_id'),))
+        exists = cursor.fetchone()
+
+        if exists:
+            skip_count += 1
+            continue
+        # Insert into table
+        try:
+            round_trips += 3
+            with conn.transaction():
+                cursor.execute(insert_query, [job.get(column) for column in LOAD_COLUMNS] + [
+                    job.get('title'), job.get('qualifications'), job.get('responsibilities'),
+                    job.get('description')])
+            insert_count += 1
+
+        except ROW_ERRORS as e:
+            rejects.append((job, str(e)))
+
+    error_count = write_dead_letters(cursor, rejects)
+    conn.commit()
+    cursor.close()
+    elapsed = time.perf_counter() - start
+    metrics.inc('pipeline_db_round_trips_total', round_trips + 1)
+    metrics.observe('pipeline_stage_seconds', elapsed, stage='load')
+    metrics.inc('pipeline_rows_loaded_total', insert_count, outcome='inserted')
+    metrics.inc('pipeline_rows_loaded_total', skip_count, outcome='skipped')
+
+    print(f"Summary: {insert_count} inserted, {skip_count} skipped, {error_count} failed")
+    logging.info(f"Summary: {insert_count} inserted, {skip_count} skipped, {error_count} failed", extra={
+        'event': 'load_batch', 'mode': 'row', 'inserted': insert_count, 'skipped': skip_count,
+        'failed': error_count, 'seconds': round(elapsed, 3)
+    })
+
+    return insert_count, skip_count
+
+
+def copy_jobs(cursor, table_name, table, chunk_rows=10000):
+    # Stream a validated Arrow table (see validate_jobs) into table_name with
+    # COPY. Arrow writes it as CSV a chunk at a time, which avoids building
+    # a Python row per job. Arrow's CSV quoting matches Postgres: unquoted
+    # empty is NULL, "" is an empty string.
+    #
+    # Metadata columns are optional, missing ones fall back to NULL. TEXT[]
+    # columns go over as array literals.
+    present = [column for column in LOAD_COLUMNS + [BATCH_ROW_COLUMN] if column in table.column_names]
+    columns = ', '.join(present)
+    table = table.select(present)
+    for column in HIGHLIGHT_ITEM_COLUMNS:
+        if column in present:
+            table = table.set_column(present.index(column), column, pg_array_literals(table[column]))
+    options = pa_csv.WriteOptions(include_header=False)
+    metrics.inc('pipeline_db_round_trips_total')
+    with cursor.copy(f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv)") as copy:
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            buffer = io.BytesIO()
+            pa_csv.write_csv(batch, buffer, options)
+            copy.write(buffer.getvalue())
+
+
+def record_job_changes(cursor, stage_source):
+    # Append a job_changes row for every staged job whose stored content
+    # differs. Must run before the merge, while jobs still has the old values.
+    # Rows loaded before content_hash existed only show up here if a field
+    # really differs.
+    differences = ', '.join(
+        f"CASE WHEN s.{column} IS DISTINCT FROM j.{column} THEN '{column}' END"
+        for column in JOB_COLUMNS if column != 'job_id' and column not in VOLATILE_COLUMNS)
+
+    metrics.inc('pipeline_db_round_trips_total')
+    cursor.execute(f"""
+    INSERT INTO job_changes (job_id, run_id, old_hash, new_hash, changed_columns)
+    SELECT job_id, run_id, old_hash, new_hash, changed_columns
+    FROM (
+        SELECT s.job_id, s.run_id, j.content_hash AS old_hash, s.content_hash AS new_hash,
+               array_remove(ARRAY[{differences}], NULL) AS changed_columns
+        FROM (
+            SELECT DISTINCT ON (job_id) * FROM {stage_source} ORDER BY job_id, {BATCH_ROW_COLUMN} DESC
+        ) s
+        JOIN jobs j USING (job_id)
+        WHERE j.content_hash IS DISTINCT FROM s.content_hash
+    ) diff
+    WHERE cardinality(changed_columns) > 0
+    """)
+    return cursor.rowcount
+
+
+def check_on_conflict(on_conflict):
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be 'changed', 'nothing' or 'update', got {on_conflict!r}")
+
+
+def merge_stage(cursor, stage_tables, on_conflict):
+    # Merge one or more staging tables into jobs and return one row per
+    # written job: (job_id, True) for an insert, (job_id, False) for an
+    # update. Staging tables must hold disjoint job_ids.
+    #
+    # jobs is partitioned on posted_at_ts, which is part of its primary key,
+    # so ON CONFLICT (job_id) has no unique index to use. Instead the merge
+    # holds JOBS_MERGE_LOCK, updates the stored jobs in place (posted_at_ts
+    # keeps its first value) and inserts the job_ids not stored yet.
+    columns = ', '.join(LOAD_COLUMNS)
+    if isinstance(stage_tables, str):
+        stage_source = stage_tables
+    else:
+        stage_source = '(' + ' UNION ALL '.join(
+            f"SELECT * FROM {stage}" for stage in stage_tables) + ') staged'
+
+    metrics.inc('pipeline_db_round_trips_total')
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (JOBS_MERGE_LOCK,))
+    create_job_partitions(cursor, stage_source)
+
+    # DISTINCT ON keeps a single row per job_id, the last fetched one, so
+    # duplicates inside the batch are counted as skipped, the same as the
+    # row-by-row path
+    results = []
+    if on_conflict != 'nothing':
+        condition = ''
+        if on_conflict == 'changed':
+            # Compared in bulk against the stored hashes, so write volume
+            # follows the number of real changes, not the batch size
+            record_job_changes(cursor, stage_source)
+            condition = "AND jobs.content_hash IS DISTINCT FROM s.content_hash"
+
+        updates = ', '.join(
+            f"{column} = s.{column}" for column in LOAD_COLUMNS if column not in ('job_id', PARTITION_COLUMN))
+        # Bump the watermark so downstream incremental models pick the row up again
+        metrics.inc('pipeline_db_round_trips_total')
+        cursor.execute(f"""
+        UPDATE jobs SET {updates}, ingested_at = now(),
+            search_vector = job_search_vector(s.title, s.qualifications, s.responsibilities, s.description)
+        FROM (
+            SELECT DISTINCT ON (job_id) * FROM {stage_source} ORDER BY job_id, {BATCH_ROW_COLUMN} DESC
+        ) s
+        WHERE jobs.job_id = s.job_id {condition}
+        RETURNING jobs.job_id
+        """)
+        results.extend((job_id, False) for job_id, in cursor.fetchall())
+
+    metrics.inc('pipeline_db_round_trips_total')
+    cursor.execute(f"""
+    INSERT INTO jobs ({columns}, search_vector)
+    SELECT DISTINCT ON (job_id) {columns}, {SEARCH_VECTOR_SQL}
+    FROM (SELECT * FROM {stage_source}) s
+    WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.job_id = s.job_id)
+    ORDER BY job_id, {BATCH_ROW_COLUMN} DESC
+    RETURNING job_id
+    """)
+    results.extend((job_id, True) for job_id, in cursor.fetchall())
+    return results
+
+
+def write_job_skills(cursor, table, results):
+    # Replace the job_skills rows of the jobs the merge just wrote with the
+    # skills the extraction stage found. Skipped jobs keep theirs. The flat
+    # (job_id, skill, mentions) rows are built by Arrow and COPYed in.
+    if 'skills' not in table.column_names or not results:
+        return 0
+
+    written = {job_id for job_id, _ in results}
+    # Last occurrence per job_id: the rows are in BATCH_ROW_COLUMN order, so
+    # this is the version merge_stage wrote
+    rows = {}
+    for index, job_id in enumerate(table['job_id'].to_pylist()):
+        if job_id in written:
+            rows[job_id] = index
+    jobs = table.take(pa.array(list(rows.values()), pa.int64()))
+
+    skills = jobs['skills'].combine_chunks()
+    flat = pc.list_flatten(skills)
+    skill_rows = pa.table({
+        'job_id': pc.take(jobs['job_id'], pc.list_parent_indices(skills)),
+        'skill': pc.struct_field(flat, [0]),
+        'mentions': pc.struct_field(flat, [1])
+    })
+
+    metrics.inc('pipeline_db_round_trips_total')
+    cursor.execute("DELETE FROM job_skills WHERE job_id = ANY(%s)", (list(rows),))
+    if skill_rows.num_rows:
+        options = pa_csv.WriteOptions(include_header=False)
+        metrics.inc('pipeline_db_round_trips_total')
+        with cursor.copy("COPY job_skills (job_id, skill, mentions) FROM STDIN WITH (FORMAT csv)") as copy:
+            for batch in skill_rows.to_batches(max_chunksize=10000):
+                buffer = io.BytesIO()
+                pa_csv.write_csv(batch, buffer, options)
+                copy.write(buffer.getvalue())
+    metrics.inc('pipeline_skill_rows_total', skill_rows.num_rows)
+    return skill_rows.num_rows
+
+
+def report_load(mode, on_conflict, total, results, start, failed=0):
+    # results holds (job_id, inserted) for every row merge_stage wrote
+    insert_count = sum(1 for _, inserted in results if inserted)
+    update_count = len(results) - insert_count
+    skip_count = total - insert_count - update_count - failed
+
+    elapsed = time.perf_counter() - start
+    metrics.observe('pipeline_stage_seconds', elapsed, stage='load')
+    metrics.inc('pipeline_rows_loaded_total', insert_count, outcome='inserted')
+    metrics.inc('pipeline_rows_loaded_total', update_count, outcome='updated')
+    metrics.inc('pipeline_rows_loaded_total', skip_count, outcome='skipped')
+
+    if on_conflict != 'nothing':
+        summary = f"Summary: {insert_count} inserted, {update_count} updated, {skip_count} skipped"
+    else:
+        summary = f"Summary: {insert_count} inserted, {skip_count} skipped"
+    if failed:
+        summary += f", {failed} failed"
+    print(summary)
+    logging.info(summary, extra={
+        'event': 'load_batch', 'mode': mode, 'on_conflict': on_conflict, 'rows': total,
+        'inserted': insert_count, 'updated': update_count, 'skipped': skip_count,
+        'failed': failed, 'seconds': round(elapsed, 3)
+    })
+
+    return insert_count, skip_count
+
+
+def copy_isolating_failures(cursor, stage_table, table, rejects):
+    # COPY table into stage_table inside a savepoint. If Postgres rejects a
+    # row, roll back to the savepoint and retry each half on its own, so one
+    # bad row costs about 2*log2(n) extra COPYs instead of the whole batch and
+    # ends up in rejects with the error.
+    if table.num_rows == 0:
+        return
+    try:
+        # SAVEPOINT and RELEASE (or ROLLBACK TO) around the COPY
+        metrics.inc('pipeline_db_round_trips_total', 2)
+        with cursor.connection.transaction():
+            copy_jobs(cursor, stage_table, table)
+    except ROW_ERRORS as e:
+        if table.num_rows == 1:
+            rejects.append((table.to_pylist()[0], str(e)))
+            return
+        half = table.num_rows // 2
+        copy_isolating_failures(cursor, stage_table, table.slice(0, half), rejects)
+        copy_isolating_failures(cursor, stage_table, table.slice(half), rejects)
+
+
+def bulk_insert_into_job_table(conn, all_jobs, on_conflict='changed', rejected_ids=None):
+    # Set-based load: stream the whole batch into a temp staging table with
+    # COPY, then merge it into jobs with one UPDATE and one INSERT. That is a
+    # handful of statements per batch instead of two round trips per job.
+    #
+    # on_conflict decides what happens to a job_id that is already stored:
+    #   'changed'  update it only if its content_hash differs, and record the
+    #              change in job_changes. Unchanged rows are not rewritten.
+    #   'nothing'  keep the stored row
+    #   'update'   overwrite the stored row unconditionally
+    #
+    # Rows are validated first; rows that fail validation or that Postgres
+    # rejects go to job_dead_letters (and their ids to rejected_ids, if
+    # given) while the rest of the batch still commits.
+    check_on_conflict(on_conflict)
+    start = time.perf_counter()
+    table, rejects = validate_jobs(all_jobs)
+    cursor = conn.cursor()
+
+    try:
+        # Staging table lives only for this transaction
+        metrics.inc('pipeline_db_round_trips_total')
+        cursor.execute(f"""
+        CREATE TEMP TABLE jobs_stage (LIKE jobs INCLUDING DEFAULTS, {BATCH_ROW_COLUMN} BIGINT) ON COMMIT DROP
+        """)
+
+        copy_isolating_failures(cursor, 'jobs_stage', table, rejects)
+        results = merge_stage(cursor, 'jobs_stage', on_conflict)
+        write_job_skills(cursor, table, results)
+        write_dead_letters(cursor, rejects)
+        metrics.inc('pipeline_db_round_trips_total')
+        conn.commit()
+
+    except Exception as e:
+        # Nothing from this batch was written, let the caller decide whether
+        # to retry it or leave it for the next run
+        print(f"Bulk insert failed: {e}")
+        logging.info(f"Bulk insert failed: {e}")
+        conn.rollback()
+        cursor.close()
+        raise
+
+    cursor.close()
+    if rejected_ids is not None:
+        rejected_ids.extend(row.get('job_id') for row, _ in rejects)
+    return report_load('bulk', on_conflict, len(all_jobs), results, start, failed=len(rejects))
+
+
+def partition_jobs(table, partitions):
+    # Split a batch into disjoint slices by a stable hash of job_id, so the
+    # same job always lands in the same slice
+    buckets = np.array([zlib.crc32((job_id or '').encode('utf-8')) % partitions
+                        for job_id in table['job_id'].to_pylist()], dtype=np.int64)
+    return [table.filter(pa.array(buckets == partition)) for partition in range(partitions)]
+
+
+def parallel_bulk_insert(conn, all_jobs, pool, workers=LOAD_WORKERS, on_conflict='changed'):
+    # Bulk load for large backfills. The batch is partitioned by job_id hash
+    # and every partition is COPYed by its own pooled connection into its own
+    # UNLOGGED staging table, so parsing and writing the rows runs on several
+    # server backends at once. conn then merges all staging tables into jobs
+    # in one transaction.
+    #
+    # Bad rows are isolated per partition the same way as in
+    # bulk_insert_into_job_table and dead-lettered by the merge transaction.
+    # Any other failure is all or nothing: if a COPY fails nothing is merged,
+    # if the merge fails it rolls back as a whole. Either way jobs is
+    # untouched, the staging tables are dropped and the error is raised for
+    # the caller, the same contract as bulk_insert_into_job_table.
+    check_on_conflict(on_conflict)
+    start = time.perf_counter()
+    total = len(all_jobs)
+    all_jobs, rejects = validate_jobs(all_jobs)
+
+    token = uuid.uuid4().hex[:8]
+    partitions = partition_jobs(all_jobs, max(1, workers))
+    stages = [f"jobs_stage_{token}_{index}" for index in range(len(partitions))]
+
+    def stage_partition(stage, partition):
+        partition_rejects = []
+        with pool.connection() as worker_conn:
+            with worker_conn.cursor() as cursor:
+                metrics.inc('pipeline_db_round_trips_total')
+                cursor.execute(f"CREATE UNLOGGED TABLE {stage} (LIKE jobs INCLUDING DEFAULTS, {BATCH_ROW_COLUMN} BIGINT)")
+                copy_isolating_failures(cursor, stage, partition, partition_rejects)
+            # The pool commits when the connection goes back
+            metrics.inc('pipeline_db_round_trips_total')
+        return partition_rejects
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix='load') as executor:
+            futures = [executor.submit(stage_partition, stage, partition)
+                       for stage, partition in zip(stages, partitions)]
+            # Wait for every worker before deciding, so no COPY is still
+            # running when the staging tables are dropped
+            errors = [future.exception() for future in futures]
+        failed = [error for error in errors if error is not None]
+        if failed:
+            raise failed[0]
+        for future in futures:
+            rejects.extend(future.result())
+
+        cursor = conn.cursor()
+        try:
+            results = merge_stage(cursor, stages, on_conflict)
+            write_job_skills(cursor, all_jobs, results)
+            write_dead_letters(cursor, rejects)
+            metrics.inc('pipeline_db_round_trips_total')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    except Exception as e:
+        print(f"Parallel bulk insert failed, nothing merged: {e}")
+        logging.info(f"Parallel bulk insert failed, nothing merged: {e}", extra={
+            'event': 'load_failed', 'mode': 'parallel', 'workers': len(stages), 'rows': total
+        })
+        raise
+
+    finally:
+        try:
+            with pool.connection() as cleanup_conn:
+                # DROP, and the commit when the connection goes back
+                metrics.inc('pipeline_db_round_trips_total', 2)
+                cleanup_conn.execute(f"DROP TABLE IF EXISTS {', '.join(stages)}")
+        except Exception as e:
+            logging.info(f"Could not drop staging tables {stages}: {e}")
+
+    return report_load('parallel', on_conflict, total, results, start, failed=len(rejects))
+
+
+def count_known_jobs(conn, job_ids):
+    # How many of job_ids are already stored, one round trip for a whole page
+    metrics.inc('pipeline_db_round_trips_total')
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM jobs WHERE job_id = ANY(%s)", (list(job_ids),))
+        return cursor.fetchone()[0]
+
+
+def load_from_queue(conn, page_queue, prepare, load=bulk_insert_into_job_table, batch_size=500,
+                    on_loaded=None, max_latency=5.0):
+    # Writer side of the streaming pipeline. Pages are buffered into a
+    # micro-batch that is flushed once it reaches batch_size rows, or once
+    # its oldest page has waited max_latency seconds so rows are not held
+    # back by slow fetches. A queue that is only momentarily empty does not
+    # flush: every flush is a merge and a seen index update, so batches
+    # should be as full as the latency allows.
+    # Memory is bounded by the queue depth plus one batch. Each batch of raw
+    # jobs, with the search each job came from, goes through prepare in one
+    # pass before loading. on_loaded gets the pages of every committed batch,
+    # which is what moves the checkpoint watermark; a failed batch is dropped
+    # and its pages fetched again on the next run.
+    batch = []
+    batch_queries = []
+    batch_pages = []
+    # time.monotonic() by which the buffered rows must be loaded
+    deadline = None
+    failed_queries = set()
+    total_inserted = 0
+    total_skipped = 0
+    page_count = 0
+
+    def flush():
+        nonlocal batch, batch_queries, batch_pages, deadline, total_inserted, total_skipped
+        deadline = None
+        if not batch:
+            return
+        try:
+            inserted, skipped = load(conn, prepare(batch, batch_queries))
+        except Exception as e:
+            logging.info(f"Dropping batch of {len(batch)} jobs from {len(batch_pages)} pages: {e}")
+            # Later pages of these queries must not move the watermark past
+            # the pages that were just lost
+            failed_queries.update(page['query'] for page in batch_pages)
+        else:
+            total_inserted += inserted
+            total_skipped += skipped
+            loaded_pages = [page for page in batch_pages if page['query'] not in failed_queries]
+            if on_loaded and loaded_pages:
+                on_loaded(loaded_pages)
+        batch = []
+        batch_queries = []
+        batch_pages = []
+
+    while True:
+        timeout = max_latency if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            page = page_queue.get(timeout=timeout)
+        except queue.Empty:
+            flush()
+            continue
+
+        if page is PAGES_DONE:
+            break
+
+        if deadline is None:
+            deadline = time.monotonic() + max_latency
+        page_count += 1
+        batch.extend(page['jobs'])
+        batch_queries.extend([page['query']] * len(page['jobs']))
+        batch_pages.append({key: value for key, value in page.items() if key != 'jobs'})
+
+        if len(batch) >= batch_size or time.monotonic() >= deadline:
+            flush()
+
+    flush()
+
+    print(f"Streamed {page_count} pages: {total_inserted} inserted, {total_skipped} skipped")
+    logging.info(f"Streamed {page_count} pages: {total_inserted} inserted, {total_skipped} skipped", extra={
+        'event': 'load_stream', 'pages': page_count, 'inserted': total_inserted, 'skipped': total_skipped,
+        'failed_queries': sorted(failed_queries)
+    })
+    return total_inserted, total_skipped
@@ -0,0 +1,102 @@
+import os
+import copy
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+LOG_DIR = os.getenv('LOG_DIR', 'logs')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# json for machine-readable lines, text for the old human format
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_MB', '20')) * 1024 * 1024
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+
+# Attributes every LogRecord has. Anything else came in through extra= and
+# is written out as its own JSON field.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line: timestamp, level, logger, thread, message and
+    # any extra= fields, e.g.
+    #   logging.info("Loaded batch", extra={'inserted': 480, 'skipped': 20})
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        elif record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+_traceback_formatter = logging.Formatter()
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare formats the whole record into its message and drops
+    # exc_info, so the listener's JsonFormatter would get the traceback glued
+    # onto the message and no exception field. Keep the fields apart: merge
+    # the args into msg and render the traceback into exc_text here, while
+    # the frames are still alive, and let the listener's formatter do the rest.
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener = None
+
+
+def setup_logging(file_name, log_dir=LOG_DIR, level=LOG_LEVEL):
+    # Callers only pay for putting the record on an in-memory queue. A
+    # QueueListener thread formats it and writes it to a size-capped rotating
+    # file, so slow disk I/O never stalls fetching or loading.
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, file_name),
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    if LOG_FORMAT == 'json':
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(StructuredQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    # Drain whatever is still queued when the process exits
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+METRICS_DIR = os.getenv('METRICS_DIR', 'metrics')
+# Prometheus text file, e.g. for the node_exporter textfile collector
+METRICS_PROM_FILE = os.getenv('METRICS_PROM_FILE', os.path.join(METRICS_DIR, 'pipeline.prom'))
+# Serve /metrics on this port while the pipeline runs, 0 to disable
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Upper bounds in seconds, wide enough for a single COPY chunk up to a full
+# SerpAPI retry cycle
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+DESCRIPTIONS = {
+    'pipeline_stage_seconds': 'Latency of one unit of work per pipeline stage',
+    'pipeline_pages_total': 'SerpAPI result pages fetched',
+    'pipeline_jobs_fetched_total': 'Jobs returned by SerpAPI',
+    'pipeline_rows_normalized_total': 'Jobs normalised',
+    'pipeline_rows_loaded_total': 'Rows handed to the loader, by outcome',
+    'pipeline_db_round_trips_total': 'Statements and commits sent to Postgres',
+}
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{key}="{value}"' for key, value in labels)
+    return '{' + inner + '}'
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    # Counters and latency histograms for one pipeline run, keyed by name and
+    # a sorted tuple of label pairs. Collectors are callables returning
+    # {name: value} read at export time, so components that already keep
+    # their own stats (cache, rate limiter) are exported without duplicating
+    # their bookkeeping.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('pipeline_stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def add_collector(self, prefix, collect):
+        self.collectors.append((prefix, collect))
+
+    def _collected(self):
+        values = {}
+        for prefix, collect in self.collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                logging.info(f"Metrics collector {prefix} failed: {e}")
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values[f"{prefix}_{key}"] = value
+        return values
+
+    def counter_total(self, name):
+        with self._lock:
+            return sum(value for (counter, _), value in self.counters.items() if counter == name)
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+
+        described = set()
+        for (name, labels), value in counters:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_label_text(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_label_text(labels)} {histogram.count}")
+
+        for name, value in sorted(self._collected().items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path=METRICS_PROM_FILE):
+        # Atomic so a scraper never reads half a file
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def summary(self, **extra):
+        elapsed = time.time() - self.started
+        with self._lock:
+            stages = {
+                dict(labels).get('stage', name): {
+                    'count': histogram.count,
+                    'total_seconds': round(histogram.sum, 3),
+                    'mean_seconds': round(histogram.sum / histogram.count, 4) if histogram.count else 0.0,
+                    'p50_seconds': histogram.quantile(0.5),
+                    'p95_seconds': histogram.quantile(0.95)
+                }
+                for (name, labels), histogram in self.histograms.items()
+            }
+            counters = {
+                name + _label_text(labels): value for (name, labels), value in sorted(self.counters.items())
+            }
+
+        pages = self.counter_total('pipeline_pages_total')
+        rows = self.counter_total('pipeline_rows_loaded_total')
+        return {
+            **extra,
+            'elapsed_seconds': round(elapsed, 3),
+            'pages_per_sec': round(pages / elapsed, 3) if elapsed else 0.0,
+            'rows_per_sec': round(rows / elapsed, 3) if elapsed else 0.0,
+            'stages': stages,
+            'counters': counters,
+            'components': self._collected()
+        }
+
+    def write_summary(self, run_id, directory=METRICS_DIR, **extra):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"run-{run_id}.json")
+        with open(path, 'w') as f:
+            json.dump(self.summary(run_id=run_id, **extra), f, indent=2)
+        return path
+
+    def serve(self, port=METRICS_PORT, host='127.0.0.1'):
+        # /metrics on a local port for the duration of the run
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
+
+
+# One registry per process, shared by every stage
+metrics = MetricsRegistry()
@@ -0,0 +1,257 @@
+import re
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from loader import JOB_COLUMNS, COLUMN_TYPES, PARTITION_COLUMN, VOLATILE_COLUMNS
+from metrics import metrics
+
+# Everything but the key and the posting age goes into content_hash
+HASHED_COLUMNS = [column for column in JOB_COLUMNS if column != 'job_id' and column not in VOLATILE_COLUMNS]
+
+# Relative ages as SerpAPI shows them ("21 hours ago", "30+ days ago").
+# Months and years are fixed lengths, the same as job_posted_at() in SQL.
+POSTED_AGO_PATTERN = r'(?P<count>\d{1,4})\+?\s*(?P<unit>minute|hour|day|week|month|year)s?\s+ago'
+POSTED_UNIT_SECONDS = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+    'week': 7 * 86400,
+    'month': 30 * 86400,
+    'year': 365 * 86400
+}
+
+BASE_FIELDS = ['title', 'location', 'company_name', 'description', 'job_id']
+EXTENSION_FIELDS = ['posted_at', 'schedule_type']
+FLAG_FIELDS = ['dental_coverage', 'health_coverage']
+
+# Section title substring -> text column and list column, checked in this
+# order like normalize_job
+HIGHLIGHT_SECTIONS = [
+    ('qualification', 'qualifications', 'qualification_items'),
+    ('benefits', 'benefits', 'benefit_items'),
+    ('responsibilities', 'responsibilities', 'responsibility_items')
+]
+
+# Only the fields normalisation reads. Converting with an explicit schema
+# skips type inference and ignores everything else in the payload.
+RAW_JOB_SCHEMA = pa.schema(
+    [(field, pa.string()) for field in BASE_FIELDS] + [
+        ('job_highlights', pa.list_(pa.struct([
+            ('title', pa.string()),
+            ('items', pa.list_(pa.string()))
+        ]))),
+        ('detected_extensions', pa.struct(
+            [(field, pa.string()) for field in EXTENSION_FIELDS] +
+            [(field, pa.bool_()) for field in FLAG_FIELDS]
+        ))
+    ]
+)
+
+
+def resolve_posted_at(posted_at, fetched_at):
+    # posted_at relative to fetched_at as a timestamp. "yesterday" is a day
+    # back; anything else without an age ("Just posted", missing) is taken
+    # as posted when fetched.
+    text = (posted_at or '').lower()
+    match = re.search(POSTED_AGO_PATTERN, text)
+    if match:
+        return fetched_at - timedelta(seconds=int(match['count']) * POSTED_UNIT_SECONDS[match['unit']])
+    if 'yesterday' in text:
+        return fetched_at - timedelta(days=1)
+    return fetched_at
+
+
+def normalize_job(job, fetched_at=None):
+    # Original per-job normalisation, kept as the reference implementation
+    # for normalize_jobs_table and for the LOAD_MODE=row path
+    fetched_at = fetched_at or datetime.now(timezone.utc)
+
+    # Extract Nested Dictionary Data
+    job_data = {
+        'title': job.get('title', ''),
+        'location': job.get('location', ''),
+        'company_name': job.get('company_name', ''),
+        'description': job.get('description', ''),
+        'job_id': job.get('job_id', '')
+    }
+
+    # Extract Job highlights info out of job_highlights list of dictionaries.
+    job_highlights = job.get('job_highlights', [])
+
+    for highlight in job_highlights:
+        title = highlight.get('title', "").lower()
+        item = highlight.get('items', [])
+
+        if "qualification" in title:
+            job_data['qualifications'] = ','.join(item)
+            job_data['qualification_items'] = list(item)
+        elif 'benefits' in title:
+            job_data['benefits'] = ','.join(item)
+            job_data['benefit_items'] = list(item)
+        elif 'responsibilities' in title:
+            job_data['responsibilities'] = ','.join(item)
+            job_data['responsibility_items'] = list(item)
+
+    # Extract extension data form extensions dictionary
+    extensions = job.get('detected_extensions', {})
+
+    job_data['posted_at'] = extensions.get('posted_at', '')
+    job_data['posted_at_ts'] = resolve_posted_at(job_data['posted_at'], fetched_at)
+    job_data['schedule_type'] = extensions.get('schedule_type', '')
+    job_data['dental_coverage'] = extensions.get(
+        'dental_coverage', '')
+    job_data['health_coverage'] = extensions.get(
+        'health_coverage', '')
+
+    return job_data
+
+
+def normalize_jobs_loop(jobs, fetched_at=None):
+    # fetched_at is one time for the batch or one per job
+    if fetched_at is None or isinstance(fetched_at, datetime):
+        fetched_at = [fetched_at or datetime.now(timezone.utc)] * len(jobs)
+    return [normalize_job(job, fetched) for job, fetched in zip(jobs, fetched_at)]
+
+
+def _stored_flag(value):
+    # Postgres cast JSON booleans to 'true'/'false' on the row-by-row INSERT
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return value
+
+
+def _last_section_per_job(parents, mask, values, job_count):
+    # For every job, the value of its last highlight section matching mask
+    # (a later section of the same kind overwrites an earlier one), else null
+    positions = np.flatnonzero(mask)
+    owners = parents[positions]
+    is_last = np.append(owners[1:] != owners[:-1], True) if len(owners) else np.array([], dtype=bool)
+
+    index = np.full(job_count, -1, dtype=np.int64)
+    index[owners[is_last]] = positions[is_last]
+    return values.take(pa.array(index, mask=index < 0))
+
+
+def _posted_times(posted_at, fetched_at):
+    # Columnar resolve_posted_at: fetched_at (a timestamp array) minus the
+    # age parsed out of posted_at, as timestamp[us, UTC]
+    lowered = pc.utf8_lower(posted_at)
+    parts = pc.extract_regex(lowered, POSTED_AGO_PATTERN)
+    matched = parts.is_valid()
+
+    counts = pc.cast(pc.if_else(matched, pc.struct_field(parts, 'count'), '0'), pa.int64()).to_numpy()
+    units = pc.index_in(pc.struct_field(parts, 'unit'), value_set=pa.array(list(POSTED_UNIT_SECONDS)))
+    unit_seconds = np.array(list(POSTED_UNIT_SECONDS.values()), dtype=np.int64)
+    seconds = np.where(matched.to_numpy(zero_copy_only=False),
+                       counts * unit_seconds[pc.fill_null(units, 0).to_numpy()], 0)
+    yesterday = pc.and_(pc.invert(matched), pc.fill_null(pc.match_substring(lowered, 'yesterday'), False))
+    seconds = np.where(yesterday.to_numpy(zero_copy_only=False), 86400, seconds)
+
+    fetched = pc.cast(fetched_at, pa.int64()).to_numpy()
+    return pa.array(fetched - seconds * 1000000, pa.int64()).cast(COLUMN_TYPES[PARTITION_COLUMN])
+
+
+def normalize_jobs_table(jobs, fetched_at=None):
+    # fetched_at, one time for the batch or one per job, is what the
+    # relative posted_at is resolved against; by default now, which in the
+    # streaming pipeline is seconds after the fetch. Landing replays pass
+    # the landed fetch times.
+    with metrics.timer('normalize'):
+        table = _normalize_jobs_table(jobs, fetched_at)
+    metrics.inc('pipeline_rows_normalized_total', table.num_rows)
+    return table
+
+
+def _normalize_jobs_table(jobs, fetched_at=None):
+    # Columnar version of normalize_job: turns a batch of raw jobs_results
+    # (one page or many) into an Arrow table with one row per job and the
+    # loader's columns. The nested payload is converted once against
+    # RAW_JOB_SCHEMA and everything after that runs as whole-column Arrow
+    # kernels. Output columns are strings, apart from the highlight item
+    # lists, which the loader COPYs as Postgres arrays.
+    if not jobs:
+        return pa.table({column: pa.array([], COLUMN_TYPES[column]) for column in JOB_COLUMNS})
+
+    try:
+        raw = pa.Table.from_pylist(jobs, schema=RAW_JOB_SCHEMA)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        # A field came back with an unexpected type, fall back to the loop
+        logging.info(f"Columnar normalisation failed ({e}), using per-job loop")
+        rows = normalize_jobs_loop(jobs, fetched_at)
+        return pa.table({
+            column: pa.array([_stored_flag(row.get(column)) for row in rows], COLUMN_TYPES[column])
+            for column in JOB_COLUMNS
+        })
+
+    columns = {}
+    for field in BASE_FIELDS:
+        columns[field] = pc.fill_null(raw[field].combine_chunks(), '')
+
+    highlights = raw['job_highlights'].combine_chunks()
+    sections = pc.list_flatten(highlights)
+    parents = pc.list_parent_indices(highlights).to_numpy()
+    titles = pc.utf8_lower(pc.fill_null(pc.struct_field(sections, 'title'), ''))
+    item_lists = pc.fill_null(pc.struct_field(sections, 'items'), pa.scalar([], pa.list_(pa.string())))
+    items = pc.fill_null(pc.binary_join(item_lists, ','), '')
+
+    unmatched = np.ones(len(sections), dtype=bool)
+    for needle, column, items_column in HIGHLIGHT_SECTIONS:
+        matches = pc.match_substring(titles, needle).to_numpy(zero_copy_only=False) & unmatched
+        unmatched &= ~matches
+        columns[column] = _last_section_per_job(parents, matches, items, raw.num_rows)
+        columns[items_column] = _last_section_per_job(parents, matches, item_lists, raw.num_rows)
+
+    extensions = raw['detected_extensions'].combine_chunks()
+    for field in EXTENSION_FIELDS:
+        columns[field] = pc.fill_null(pc.struct_field(extensions, field), '')
+    for field in FLAG_FIELDS:
+        flags = pc.struct_field(extensions, field)
+        columns[field] = pc.fill_null(pc.if_else(flags, 'true', 'false'), '')
+
+    if fetched_at is None or isinstance(fetched_at, datetime):
+        fetched_at = [fetched_at or datetime.now(timezone.utc)] * raw.num_rows
+    fetched_at = pa.array(fetched_at, COLUMN_TYPES[PARTITION_COLUMN])
+    columns[PARTITION_COLUMN] = _posted_times(columns['posted_at'], fetched_at)
+
+    return pa.table({column: columns[column] for column in JOB_COLUMNS})
+
+
+def _hash_field(value):
+    # NULL, '' and lists all encode differently; list elements are separated
+    # by another control character, so moving a comma between two bullets
+    # changes the hash even though the joined text stays the same
+    if value is None:
+        return '\x00'
+    if isinstance(value, list):
+        return '\x1d' + '\x1e'.join('\x00' if item is None else item for item in value)
+    return value
+
+
+def content_hashes(table):
+    # Stable md5 per row over the normalised job fields. Fields are separated
+    # by a control character that does not occur in the data.
+    columns = [table[column].to_pylist() for column in HASHED_COLUMNS]
+    return [
+        hashlib.md5('\x1f'.join(_hash_field(value) for value in values).encode('utf-8')).hexdigest()
+        for values in zip(*columns)
+    ]
+
+
+def add_load_metadata(table, run_id, queries):
+    # Append the ingestion metadata columns. run_id is one id for the whole
+    # batch or one per row (landing replays keep each row's original run).
+    if isinstance(run_id, str):
+        run_id = [run_id] * table.num_rows
+
+    table = table.append_column('run_id', pa.array(run_id, pa.string()))
+    table = table.append_column('query', pa.array(queries, pa.string()))
+    with metrics.timer('hash'):
+        hashes = content_hashes(table)
+    return table.append_column('content_hash', pa.array(hashes, pa.string()))
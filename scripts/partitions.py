@@ -0,0 +1,105 @@
+import os
+import logging
+import argparse
+from datetime import date
+
+from db import get_pool, close_pool
+from loader import create_job_table, JOBS_MERGE_LOCK
+from metrics import metrics
+
+# Months of postings kept by prune_job_partitions, counted back from the
+# current month. Unset keeps everything.
+JOBS_RETENTION_MONTHS = os.getenv('JOBS_RETENTION_MONTHS')
+
+
+def list_job_partitions(conn):
+    # (partition, first day of its month, estimated rows) in month order.
+    # Partitions are named jobs_pYYYYMM by create_job_partition.
+    with conn.cursor() as cursor:
+        cursor.execute("""
+        SELECT c.relname, c.reltuples::bigint
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'jobs'::regclass AND c.relname ~ '^jobs_p[0-9]{6}$'
+        ORDER BY c.relname
+        """)
+        return [(name, date(int(name[6:10]), int(name[10:12]), 1), max(rows, 0))
+                for name, rows in cursor.fetchall()]
+
+
+def create_future_partitions(conn, months=3):
+    # Pre-create the partitions of the next months so no load has to
+    with conn.cursor() as cursor:
+        cursor.execute("""
+        SELECT create_job_partition(now() + make_interval(months => ahead))
+        FROM generate_series(0, %s) ahead
+        """, (months,))
+        created = [name for name, in cursor.fetchall()]
+    conn.commit()
+    return created
+
+
+def prune_job_partitions(conn, keep_months):
+    # Drop whole months of postings older than keep_months before the
+    # current month. Dropping a partition is a catalog change, not a DELETE
+    # over the rows, so retention costs the same whatever the table size.
+    # The dropped jobs' skills go with them.
+    today = date.today()
+    months = today.year * 12 + today.month - 1 - keep_months
+    cutoff = date(months // 12, months % 12 + 1, 1)
+
+    expired = [name for name, month, _ in list_job_partitions(conn) if month < cutoff]
+    if not expired:
+        return []
+
+    with metrics.timer('prune'), conn.cursor() as cursor:
+        # Loads hold the same lock while they check and insert job_ids
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (JOBS_MERGE_LOCK,))
+        for name in expired:
+            cursor.execute(f"ALTER TABLE jobs DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+        cursor.execute("""
+        DELETE FROM job_skills s WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.job_id = s.job_id)
+        """)
+        skills = cursor.rowcount
+    conn.commit()
+    metrics.inc('pipeline_partitions_pruned_total', len(expired))
+
+    print(f"Pruned {len(expired)} job partitions before {cutoff}: {', '.join(expired)}")
+    logging.info(f"Pruned {len(expired)} job partitions before {cutoff}", extra={
+        'event': 'partition_prune', 'partitions': expired, 'cutoff': cutoff.isoformat(),
+        'skill_rows': skills})
+    return expired
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the monthly partitions of jobs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help='partitions with estimated row counts')
+
+    create = subparsers.add_parser('create', help='create the partitions of the coming months')
+    create.add_argument('--months', type=int, default=3)
+
+    prune = subparsers.add_parser('prune', help='drop partitions older than the retention window')
+    prune.add_argument('--keep-months', type=int, default=int(JOBS_RETENTION_MONTHS or 12))
+
+    subparsers.add_parser('migrate', help='create or partition jobs (also done by every run)')
+
+    args = parser.parse_args()
+    try:
+        with get_pool().connection() as conn:
+            if args.command == 'list':
+                for name, month, rows in list_job_partitions(conn):
+                    print(f"{name}\t{month}\t{rows}")
+            elif args.command == 'create':
+                print('\n'.join(create_future_partitions(conn, args.months)))
+            elif args.command == 'prune':
+                prune_job_partitions(conn, args.keep_months)
+            elif args.command == 'migrate':
+                create_job_table(conn)
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import json
+import logging
+import itertools
+
+DEFAULT_QUERY = 'data engineer seattle'
+QUERY_CONFIG = os.getenv('QUERY_CONFIG', 'queries.json')
+# Incremental crawl: stop a search after this many consecutive pages of
+# already stored jobs. 0 always pages to the end.
+STOP_AFTER_KNOWN_PAGES = int(os.getenv('STOP_AFTER_KNOWN_PAGES', '2'))
+
+
+def make_spec(q, priority=0, params=None, stop_after_known_pages=STOP_AFTER_KNOWN_PAGES):
+    params = params or {}
+    # Key identifies the query everywhere (pagination state, logs), so it must
+    # not depend on how the search was written in the config
+    key = ' '.join(q.lower().split())
+    if params:
+        key += ' ' + json.dumps(params, sort_keys=True)
+
+    return {
+        'key': key,
+        'q': q,
+        'priority': priority,
+        'params': params,
+        'stop_after_known_pages': stop_after_known_pages
+    }
+
+
+def expand_query_config(config):
+    # Turn the config into a flat list of search specs. Supports explicit
+    # searches plus a roles x locations matrix, e.g.
+    #
+    # {
+    #   "defaults": {"priority": 0, "params": {"hl": "en"}, "stop_after_known_pages": 2},
+    #   "searches": [{"q": "data engineer seattle", "priority": 10, "stop_after_known_pages": 0}],
+    #   "matrix": [{"roles": ["data engineer"], "locations": ["seattle", "remote"]}]
+    # }
+    defaults = config.get('defaults', {})
+    default_priority = defaults.get('priority', 0)
+    default_params = defaults.get('params', {})
+    default_stop = defaults.get('stop_after_known_pages', STOP_AFTER_KNOWN_PAGES)
+
+    specs = []
+    for search in config.get('searches', []):
+        params = {**default_params, **search.get('params', {})}
+        specs.append(make_spec(search['q'], search.get('priority', default_priority), params,
+                               search.get('stop_after_known_pages', default_stop)))
+
+    for entry in config.get('matrix', []):
+        params = {**default_params, **entry.get('params', {})}
+        priority = entry.get('priority', default_priority)
+        stop_after = entry.get('stop_after_known_pages', default_stop)
+        for role, location in itertools.product(entry.get('roles', []), entry.get('locations', [''])):
+            q = f"{role} {location}".strip()
+            specs.append(make_spec(q, priority, params, stop_after))
+
+    # Same search listed twice keeps the highest priority
+    unique = {}
+    for spec in specs:
+        if spec['key'] not in unique or spec['priority'] > unique[spec['key']]['priority']:
+            unique[spec['key']] = spec
+
+    # Highest priority first. The fetch pool takes work in submission order,
+    # so this is also the order chains get scheduled in.
+    return sorted(unique.values(), key=lambda spec: -spec['priority'])
+
+
+def load_query_specs(path=QUERY_CONFIG):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            specs = expand_query_config(json.load(f))
+        logging.info(f"Loaded {len(specs)} searches from {path}")
+        return specs
+
+    # No config file: SEARCH_QUERIES is a ';' separated list of plain searches
+    raw = os.getenv('SEARCH_QUERIES', DEFAULT_QUERY)
+    return [make_spec(q.strip()) for q in raw.split(';') if q.strip()]
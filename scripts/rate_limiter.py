@@ -0,0 +1,225 @@
+import os
+import time
+import random
+import logging
+import threading
+
+import requests
+
+SERPAPI_RATE_PER_SEC = float(os.getenv('SERPAPI_RATE_PER_SEC', '2'))
+SERPAPI_BURST = int(os.getenv('SERPAPI_BURST', '5'))
+SERPAPI_MAX_RETRIES = int(os.getenv('SERPAPI_MAX_RETRIES', '5'))
+SERPAPI_BACKOFF_BASE = float(os.getenv('SERPAPI_BACKOFF_BASE', '0.5'))
+SERPAPI_BACKOFF_CAP = float(os.getenv('SERPAPI_BACKOFF_CAP', '30'))
+# 0 means no run-wide limit
+SERPAPI_REQUEST_BUDGET = int(os.getenv('SERPAPI_REQUEST_BUDGET', '0'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_COOLDOWN = float(os.getenv('CIRCUIT_COOLDOWN', '60'))
+
+THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryableSearchError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class AdaptiveTokenBucket:
+    # Token bucket shared by every fetch worker. The refill rate backs off
+    # multiplicatively whenever SerpAPI throttles or errors and creeps back up
+    # additively on success (AIMD), so concurrent fetchers settle just under
+    # what the quota allows instead of repeatedly tripping it.
+
+    def __init__(self, rate=SERPAPI_RATE_PER_SEC, burst=SERPAPI_BURST, min_rate=0.1):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            # Drain the burst too, otherwise queued workers fire straight away
+            self._tokens = min(self._tokens, 0)
+        logging.info(f"SerpAPI throttled, request rate lowered to {self.rate:.2f}/s")
+
+
+class CircuitBreaker:
+    # Per query: after `threshold` consecutive failures the circuit opens and
+    # that query's requests fail fast until `cooldown` seconds have passed,
+    # then a single trial request is let through (half open). Everything
+    # else keeps failing fast until the trial's outcome is recorded: success
+    # closes the circuit, failure opens it for another cooldown.
+
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        # The trial ended without saying anything about the service (budget
+        # used up, a non-retryable error): let the next caller try instead
+        with self._lock:
+            self.probing = False
+
+
+class RequestBudget:
+    # Run-wide cap on API calls, retries included
+
+    def __init__(self, limit=SERPAPI_REQUEST_BUDGET):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def consume(self):
+        with self._lock:
+            if self.limit and self.used >= self.limit:
+                raise BudgetExhausted(f"Request budget of {self.limit} calls used up")
+            self.used += 1
+
+
+def backoff_delay(attempt, base=SERPAPI_BACKOFF_BASE, cap=SERPAPI_BACKOFF_CAP):
+    # Full jitter: uniform between 0 and the capped exponential step, which
+    # keeps retrying workers from hitting the API in lockstep
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class SearchExecutor:
+    # Every SerpAPI request goes through execute(): budget check, circuit
+    # breaker for the query, rate limiter, then the call itself with jittered
+    # exponential backoff on throttling, 5xx and network errors.
+
+    def __init__(self, bucket=None, budget=None, max_retries=SERPAPI_MAX_RETRIES):
+        self.bucket = bucket or AdaptiveTokenBucket()
+        self.budget = budget or RequestBudget()
+        self.max_retries = max_retries
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'failures': 0, 'circuit_open': 0}
+
+    def _breaker(self, query_key):
+        with self._lock:
+            if query_key not in self._breakers:
+                self._breakers[query_key] = CircuitBreaker()
+            return self._breakers[query_key]
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def execute(self, query_key, request):
+        breaker = self._breaker(query_key)
+
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                self._count('circuit_open')
+                raise CircuitOpenError(f"Circuit open for query '{query_key}'")
+
+            try:
+                self.budget.consume()
+                self.bucket.acquire()
+                self._count('requests')
+                results = request()
+            except (RetryableSearchError, requests.Timeout, requests.ConnectionError) as e:
+                breaker.record_failure()
+                if getattr(e, 'status', None) in THROTTLE_STATUSES:
+                    self._count('throttled')
+                    self.bucket.on_throttle()
+
+                if attempt == self.max_retries:
+                    self._count('failures')
+                    raise
+
+                delay = backoff_delay(attempt)
+                retry_after = getattr(e, 'retry_after', None)
+                if retry_after:
+                    delay = max(delay, retry_after)
+
+                self._count('retries')
+                logging.info(f"[{query_key}] Request failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+
+            breaker.record_success()
+            self.bucket.on_success()
+            return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['budget_used'] = self.budget.used
+        stats['rate_per_sec'] = round(self.bucket.rate, 3)
+        return stats
+
+
+_search_executor = None
+_search_executor_lock = threading.Lock()
+
+
+def get_search_executor():
+    # One executor per process so every worker shares the bucket and budget
+    global _search_executor
+    with _search_executor_lock:
+        if _search_executor is None:
+            _search_executor = SearchExecutor()
+        return _search_executor
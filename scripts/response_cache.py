@@ -0,0 +1,183 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+
+RESPONSE_CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR', os.path.join('cache', 'serpapi'))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', str(6 * 60 * 60)))
+RESPONSE_CACHE_MAX_MB = int(os.getenv('RESPONSE_CACHE_MAX_MB', '512'))
+
+# Eviction frees space down to this share of the budget, so the puts that
+# follow have headroom and a burst past the cap costs one directory scan
+RESPONSE_CACHE_LOW_WATER = 0.9
+
+# on: serve fresh entries, fetch and store misses
+# off: always call the API
+# replay: never call the API, serve whatever is cached regardless of age
+RESPONSE_CACHE_MODE = os.getenv('RESPONSE_CACHE_MODE', 'on')
+
+# Never part of the cache key, so the same search hits the same entry no
+# matter which key fetched it and replays work without credentials
+IGNORED_PARAMS = {'api_key', 'serp_api_key', 'source'}
+
+
+class ResponseCache:
+    # Content-addressed on-disk cache for SerpAPI responses. Each entry is a
+    # gzip'd JSON file named after the sha256 of the normalised request
+    # params. File mtime doubles as the LRU clock: it is bumped on every hit
+    # and the oldest files are evicted once the cache grows past max_bytes,
+    # down to low_water of it.
+
+    def __init__(self, cache_dir=RESPONSE_CACHE_DIR, ttl=RESPONSE_CACHE_TTL,
+                 max_bytes=RESPONSE_CACHE_MAX_MB * 1024 * 1024, mode=RESPONSE_CACHE_MODE,
+                 low_water=RESPONSE_CACHE_LOW_WATER):
+        if mode not in ('on', 'off', 'replay'):
+            raise ValueError(f"RESPONSE_CACHE_MODE must be 'on', 'off' or 'replay', got {mode!r}")
+
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.low_water_bytes = int(max_bytes * low_water)
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'stores': 0, 'evictions': 0,
+                       'eviction_passes': 0}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def key_for(self, params):
+        normalised = {
+            key: str(value) for key, value in params.items()
+            if key not in IGNORED_PARAMS and value is not None
+        }
+        encoded = json.dumps(normalised, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        # Two-level fan out keeps directories small
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json.gz'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def get(self, params):
+        path = self._path(self.key_for(params))
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, OSError, ValueError):
+            self._count('misses')
+            return None
+
+        # Replay mode serves stale entries, there is nothing else to serve
+        if self.mode != 'replay' and time.time() - entry['fetched_at'] > self.ttl:
+            self._count('expired')
+            self._count('misses')
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self._count('hits')
+        return entry['response']
+
+    def put(self, params, response):
+        path = self._path(self.key_for(params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        entry = {
+            'fetched_at': time.time(),
+            'params': {k: v for k, v in params.items() if k not in IGNORED_PARAMS},
+            'response': response
+        }
+
+        # Write then rename so readers never see a half written entry
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(entry, f)
+
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += os.path.getsize(path) - old_size
+            self._stats['stores'] += 1
+            over_budget = self._size > self.max_bytes
+
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        # Drop least recently used entries until back under the low-water
+        # mark. Workers that went over budget together queue on the lock;
+        # only the first one scans, the rest find the space already freed.
+        with self._lock:
+            if self._size <= self.max_bytes:
+                return
+            self._stats['eviction_passes'] += 1
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            for path, size, _ in entries:
+                if self._size <= self.low_water_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                self._size -= size
+                self._stats['evictions'] += 1
+
+    def fetch(self, params, search):
+        # Serve params from the cache, or call search() and store the result.
+        # Error responses (quota, throttling) are never cached.
+        if self.mode != 'off':
+            cached = self.get(params)
+            if cached is not None:
+                return cached
+
+        if self.mode == 'replay':
+            logging.info("Replay mode cache miss, treating as an empty page")
+            return {}
+
+        results = search()
+        if self.mode != 'off' and 'error' not in results:
+            self.put(params, results)
+        return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size_bytes'] = self._size
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    # One cache per process, shared by every fetch worker
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
@@ -0,0 +1,164 @@
+import argparse
+
+from db import get_pool, close_pool
+from loader import SEARCH_CONFIG, SEARCH_VECTOR_SQL, HIGHLIGHT_ITEM_COLUMNS
+from skills import load_skill_dictionary
+
+# Highlight section -> TEXT[] column holding its bullets
+HIGHLIGHT_SECTIONS = dict(zip(['qualifications', 'benefits', 'responsibilities'], HIGHLIGHT_ITEM_COLUMNS))
+
+# Skills counted by skill_frequencies when none are given: the canonical
+# names from the extraction stage's dictionary
+DEFAULT_SKILLS = sorted(load_skill_dictionary())
+
+
+def search_jobs(conn, text, limit=20, location=None, posted_since=None):
+    # Ranked keyword search over jobs.search_vector. text takes web search
+    # syntax ("spark -scala", "\"data platform\" or airflow"). The GIN index
+    # finds the matches; only those rows are ranked. Title hits weigh most,
+    # then qualifications, responsibilities and description. posted_since
+    # limits the scan to the monthly partitions from that date on. The
+    # tsquery's alias must not be a jobs column name (jobs has a query column).
+    sql = f"""
+    SELECT job_id, title, company_name, location,
+           ts_rank_cd(search_vector, tsq) AS rank
+    FROM jobs, websearch_to_tsquery('{SEARCH_CONFIG}', %s) tsq
+    WHERE search_vector @@ tsq
+    """
+    params = [text]
+    if location:
+        sql += " AND location ILIKE %s"
+        params.append(f"%{location}%")
+    if posted_since:
+        sql += " AND posted_at_ts >= %s::timestamptz"
+        params.append(posted_since)
+    sql += " ORDER BY rank DESC, job_id LIMIT %s"
+    params.append(limit)
+
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [column.name for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def skill_frequencies(conn, skills=DEFAULT_SKILLS, since=None):
+    # Number of postings mentioning each skill, most common first. Each skill
+    # is one GIN index lookup; multi-word skills match as phrases.
+    sql = f"""
+    SELECT skill, matches.postings
+    FROM unnest(%s::text[]) AS skill
+    CROSS JOIN LATERAL (
+        SELECT count(*) AS postings
+        FROM jobs
+        WHERE search_vector @@ phraseto_tsquery('{SEARCH_CONFIG}', skill)
+          AND (%s::timestamptz IS NULL OR ingested_at >= %s::timestamptz)
+    ) matches
+    ORDER BY matches.postings DESC, skill
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql, (list(skills), since, since))
+        return cursor.fetchall()
+
+
+def jobs_with_highlight(conn, items, section='qualifications', limit=20):
+    # Jobs whose section lists every one of items as a bullet, exact text.
+    # Array containment is answered by the column's GIN index.
+    column = HIGHLIGHT_SECTIONS[section]
+    sql = f"""
+    SELECT job_id, title, company_name, location
+    FROM jobs
+    WHERE {column} @> %s::text[]
+    ORDER BY ingested_at DESC, job_id
+    LIMIT %s
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql, (list(items), limit))
+        columns = [column.name for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def extracted_skill_counts(conn, since=None, limit=30):
+    # Postings per skill as found by the extraction stage, from job_skills
+    sql = """
+    SELECT skill, count(*) AS postings, sum(mentions) AS mentions
+    FROM job_skills
+    WHERE %s::timestamptz IS NULL OR extracted_at >= %s::timestamptz
+    GROUP BY skill
+    ORDER BY postings DESC, skill
+    LIMIT %s
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql, (since, since, limit))
+        return cursor.fetchall()
+
+
+def backfill_search_vectors(conn, batch_rows=10000):
+    # Fill search_vector for rows loaded before the column existed, a batch
+    # per transaction so the table is never locked for long
+    total = 0
+    with conn.cursor() as cursor:
+        while True:
+            cursor.execute(f"""
+            UPDATE jobs SET search_vector = {SEARCH_VECTOR_SQL}
+            WHERE job_id IN (
+                SELECT job_id FROM jobs WHERE search_vector IS NULL LIMIT %s
+            )
+            """, (batch_rows,))
+            conn.commit()
+            total += cursor.rowcount
+            if cursor.rowcount < batch_rows:
+                break
+    print(f"Backfilled search vectors for {total} jobs")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text search over stored jobs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    search = subparsers.add_parser('search', help='ranked keyword search')
+    search.add_argument('text')
+    search.add_argument('--limit', type=int, default=20)
+    search.add_argument('--location')
+    search.add_argument('--posted-since', help='only jobs posted since this timestamp')
+
+    skills = subparsers.add_parser('skills', help='postings per skill')
+    skills.add_argument('skills', nargs='*', default=DEFAULT_SKILLS)
+    skills.add_argument('--since', help='only jobs ingested since this timestamp')
+
+    highlight = subparsers.add_parser('highlight', help='jobs listing these exact bullets')
+    highlight.add_argument('items', nargs='+')
+    highlight.add_argument('--section', choices=sorted(HIGHLIGHT_SECTIONS), default='qualifications')
+    highlight.add_argument('--limit', type=int, default=20)
+
+    extracted = subparsers.add_parser('extracted', help='postings per skill from job_skills')
+    extracted.add_argument('--since', help='only skills extracted since this timestamp')
+    extracted.add_argument('--limit', type=int, default=30)
+
+    subparsers.add_parser('backfill', help='compute search_vector for older rows')
+
+    args = parser.parse_args()
+
+    try:
+        with get_pool().connection() as conn:
+            if args.command == 'search':
+                for job in search_jobs(conn, args.text, args.limit, args.location, args.posted_since):
+                    print(f"{job['rank']:.4f}  {job['title']} | {job['company_name']} | {job['location']}"
+                          f"  ({job['job_id']})")
+            elif args.command == 'skills':
+                for skill, postings in skill_frequencies(conn, args.skills, args.since):
+                    print(f"{skill:<24}{postings:>8}")
+            elif args.command == 'highlight':
+                for job in jobs_with_highlight(conn, args.items, args.section, args.limit):
+                    print(f"{job['title']} | {job['company_name']} | {job['location']}  ({job['job_id']})")
+            elif args.command == 'extracted':
+                for skill, postings, mentions in extracted_skill_counts(conn, args.since, args.limit):
+                    print(f"{skill:<24}{postings:>8}{mentions:>10}")
+            else:
+                backfill_search_vectors(conn)
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
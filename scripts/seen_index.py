@@ -0,0 +1,185 @@
+import os
+import hashlib
+import logging
+import threading
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from checkpoints import STATE_DIR
+from metrics import metrics
+
+SEEN_INDEX_PATH = os.getenv('SEEN_INDEX_PATH', os.path.join(STATE_DIR, 'seen_jobs.npz'))
+
+
+def id_hashes(job_ids):
+    # 64-bit blake2b of every job_id, as a uint64 array
+    return np.array([
+        int.from_bytes(hashlib.blake2b(job_id.encode('utf-8'), digest_size=8).digest(), 'little')
+        for job_id in job_ids
+    ], dtype=np.uint64)
+
+
+def fingerprints(content_hashes):
+    # First 64 bits of the md5 content_hash, 0 when there is none
+    return np.array([int(value[:16], 16) if value else 0 for value in content_hashes], dtype=np.uint64)
+
+
+class SeenIndex:
+    # Local record of every job committed to Postgres: a sorted uint64 array
+    # of job_id hashes with a parallel array of content fingerprints, 16 bytes
+    # per job. It sorts a batch into three groups before the database is
+    # touched:
+    #   new        id hash not in the index, the job was never loaded from here
+    #   known      id hash and fingerprint both match, nothing to write
+    #   ambiguous  id hash matches but the content differs (a real change or
+    #              a 64-bit collision), left for the merge to verify
+    # Only new and ambiguous rows are sent to the loader. The index is only
+    # ever added to after a commit, so at worst it lags the table (a crash
+    # before save, rows loaded by another process) and those jobs look new,
+    # which the merge handles like any other conflict.
+
+    def __init__(self, path=SEEN_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.keys = np.array([], dtype=np.uint64)
+        self.fingerprints = np.array([], dtype=np.uint64)
+        self.counts = {'lookups': 0, 'new': 0, 'known': 0, 'ambiguous': 0, 'ambiguous_unchanged': 0}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                self.keys = data['keys'].astype(np.uint64)
+                self.fingerprints = data['fingerprints'].astype(np.uint64)
+            logging.info(f"Loaded seen-job index with {len(self.keys)} jobs from {self.path}")
+        except Exception as e:
+            # Starting empty only costs database lookups, never correctness
+            logging.info(f"Ignoring unreadable seen-job index {self.path}: {e}")
+            self.keys = np.array([], dtype=np.uint64)
+            self.fingerprints = np.array([], dtype=np.uint64)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp.npz"
+            np.savez(tmp_path, keys=self.keys, fingerprints=self.fingerprints)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        logging.info(f"Saved seen-job index with {len(self.keys)} jobs to {self.path}")
+
+    def _positions(self, keys):
+        # Index of every key in self.keys and whether it is really there
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        return positions, found
+
+    def classify(self, job_ids, content_hashes):
+        # Boolean masks (new, known, ambiguous) over the batch
+        keys = id_hashes(job_ids)
+        prints = fingerprints(content_hashes)
+
+        with self._lock:
+            positions, found = self._positions(keys)
+            matches = np.zeros(len(keys), dtype=bool)
+            matches[found] = self.fingerprints[positions[found]] == prints[found]
+
+        new = ~found
+        known = found & matches
+        ambiguous = found & ~matches
+
+        self.counts['lookups'] += len(keys)
+        self.counts['new'] += int(new.sum())
+        self.counts['known'] += int(known.sum())
+        self.counts['ambiguous'] += int(ambiguous.sum())
+        return new, known, ambiguous
+
+    def contains_all(self, job_ids):
+        # True if every job_id is in the index, whatever its content
+        with self._lock:
+            _, found = self._positions(id_hashes(job_ids))
+        return bool(found.all())
+
+    def filter_table(self, table):
+        # Drop the jobs the index already knows unchanged. Returns the rows
+        # still to load, how many were skipped and how many of the remaining
+        # rows are ambiguous.
+        if table.num_rows == 0:
+            return table, 0, 0
+
+        _, known, ambiguous = self.classify(
+            table['job_id'].to_pylist(), table['content_hash'].to_pylist())
+        return table.filter(pa.array(~known)), int(known.sum()), int(ambiguous.sum())
+
+    def add(self, job_ids, content_hashes):
+        # Record committed jobs. Existing entries take the new fingerprint,
+        # new ones are inserted in place so the arrays stay sorted.
+        keys = id_hashes(job_ids)
+        prints = fingerprints(content_hashes)
+        if not len(keys):
+            return
+
+        # Last occurrence wins for duplicates inside the batch
+        reversed_keys = keys[::-1]
+        keys, first = np.unique(reversed_keys, return_index=True)
+        prints = prints[::-1][first]
+
+        with self._lock:
+            positions, found = self._positions(keys)
+            self.fingerprints[positions[found]] = prints[found]
+
+            missing = ~found
+            self.keys = np.insert(self.keys, positions[missing], keys[missing])
+            self.fingerprints = np.insert(self.fingerprints, positions[missing], prints[missing])
+            self._dirty = True
+
+    def add_table(self, table):
+        self.add(table['job_id'].to_pylist(), table['content_hash'].to_pylist())
+
+    def record_verified(self, ambiguous, updated):
+        # Ambiguous rows the merge did not update matched what is stored: the
+        # database round trip for them was wasted
+        self.counts['ambiguous_unchanged'] += max(ambiguous - updated, 0)
+
+    def stats(self):
+        entries = len(self.keys)
+        ambiguous = self.counts['ambiguous']
+        return {
+            **self.counts,
+            'entries': entries,
+            'memory_bytes': int(self.keys.nbytes + self.fingerprints.nbytes),
+            # Chance that a job never seen before hashes onto a stored id
+            'expected_false_positive_rate': entries / 2 ** 64,
+            # Share of database verifications that found nothing to change
+            'observed_false_positive_rate': (
+                self.counts['ambiguous_unchanged'] / ambiguous if ambiguous else 0.0)
+        }
+
+
+def skip_known(seen, load):
+    # Wrap a bulk load function so jobs the index knows unchanged never reach
+    # the database, and everything committed is added to the index
+    def load_new(conn, table):
+        with metrics.timer('seen_index'):
+            remaining, skipped, ambiguous = seen.filter_table(table)
+        metrics.inc('pipeline_rows_loaded_total', skipped, outcome='known_locally')
+        if remaining.num_rows == 0:
+            return 0, skipped
+
+        rejected_ids = []
+        inserted, merge_skipped = load(conn, remaining, rejected_ids=rejected_ids)
+        # Dead-lettered jobs were not stored and must be tried again
+        if rejected_ids:
+            rejected = pa.array(list(set(rejected_ids)), pa.string())
+            remaining = remaining.filter(pc.invert(pc.is_in(remaining['job_id'], value_set=rejected)))
+        seen.add_table(remaining)
+        seen.record_verified(ambiguous, remaining.num_rows - inserted - merge_skipped)
+        return inserted, skipped + merge_skipped
+    return load_new
@@ -0,0 +1,170 @@
+import os
+import re
+import logging
+from collections import deque
+
+import pyarrow as pa
+
+from metrics import metrics
+
+SKILLS_FILE = os.getenv('SKILLS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'skills.txt'))
+
+# Words as the matcher sees them: runs of letters, digits, + and # (c++, c#).
+# Everything else separates words, so "spark/hadoop", "ci/cd", "node.js" and
+# "scikit-learn" split into their parts, and dictionary patterns are split
+# the same way. Mapping separators to spaces with str.translate and then
+# str.split is about twice as fast as a findall over the same text.
+SEPARATORS = {code: ' ' for code in range(0x10000) if not chr(code).isalnum() and chr(code) not in '+#'}
+
+# Fields scanned per job, each its own pass so a phrase never spans two fields
+SKILL_FIELDS = ['title', 'qualifications', 'responsibilities', 'description']
+
+# A comment starts at a '#' that begins the line or follows whitespace, so
+# skills spelled with '#' ("c#", "f#") stay intact
+COMMENT = re.compile(r'(?:^|\s)#.*')
+
+SKILLS_TYPE = pa.list_(pa.struct([('skill', pa.string()), ('mentions', pa.int32())]))
+
+
+def tokenize(text):
+    return text.lower().translate(SEPARATORS).split()
+
+
+def load_skill_dictionary(path=SKILLS_FILE):
+    # One skill per line: the canonical name, optionally followed by aliases
+    # after '|', e.g. "postgresql | postgres | psql". '#' at the start of the
+    # line or after whitespace starts a comment.
+    # Returns {canonical: [alias, ...]} with the canonical name as an alias.
+    dictionary = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = COMMENT.sub('', line).strip()
+            if not line:
+                continue
+            names = [name.strip() for name in line.split('|') if name.strip()]
+            dictionary.setdefault(names[0].lower(), []).extend(name.lower() for name in names)
+    return dictionary
+
+
+class SkillMatcher:
+    # Aho-Corasick automaton over word tokens instead of characters. Every
+    # alias of every skill is one pattern; a document is tokenised once and
+    # then walked token by token through the automaton, so the cost is linear
+    # in the document length no matter how many skills the dictionary holds.
+    # Matching whole tokens also gives word boundaries for free: "java" never
+    # matches inside "javascript".
+
+    def __init__(self, dictionary):
+        self.skills = sorted(dictionary)
+        # Node 0 is the root. goto[node] maps a token to the next node,
+        # output[node] lists (skill id, pattern length in tokens) for the
+        # patterns ending there.
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        # Every token that appears in some pattern. Any other token sends the
+        # automaton back to the root, so scan only walks these.
+        self.vocabulary = set()
+
+        for skill_id, skill in enumerate(self.skills):
+            for alias in dictionary[skill]:
+                tokens = tokenize(alias)
+                if tokens:
+                    self._add(tokens, skill_id)
+                    self.vocabulary.update(tokens)
+        self._link()
+
+    def _add(self, tokens, skill_id):
+        node = 0
+        for token in tokens:
+            next_node = self.goto[node].get(token)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][token] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = next_node
+        if all(known != skill_id for known, _ in self.output[node]):
+            self.output[node].append((skill_id, len(tokens)))
+
+    def _link(self):
+        # Breadth-first failure links: the longest proper suffix of each
+        # node's path that is also a path from the root. Outputs are merged
+        # along the links so a match is reported wherever it ends.
+        pending = deque(self.goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for token, child in self.goto[node].items():
+                pending.append(child)
+                fallback = self.fail[node]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(token, 0)
+                self.fail[child] = target if target != child else 0
+                own = {skill_id for skill_id, _ in self.output[child]}
+                self.output[child] = self.output[child] + [
+                    match for match in self.output[self.fail[child]] if match[0] not in own]
+
+    def scan(self, text, counts):
+        # Add the skill mentions in text to counts {skill_id: mentions}.
+        # Most tokens of a posting are ordinary words; they are dropped by a
+        # set lookup and only a gap between the remaining positions resets
+        # the automaton, instead of walking every token. Overlapping aliases
+        # of one skill ("spark" inside "spark sql") count as one mention.
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        vocabulary = self.vocabulary
+        tokens = text.lower().translate(SEPARATORS).split()
+        ends = {}
+        node = 0
+        previous = -2
+        for position in [position for position, token in enumerate(tokens) if token in vocabulary]:
+            if position != previous + 1:
+                node = 0
+            previous = position
+            token = tokens[position]
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            for skill_id, length in output[node]:
+                if position - length >= ends.get(skill_id, -1):
+                    counts[skill_id] = counts.get(skill_id, 0) + 1
+                ends[skill_id] = position
+
+    def match(self, texts):
+        # {skill: mentions} over several texts of one document
+        counts = {}
+        for text in texts:
+            if text:
+                self.scan(text, counts)
+        return {self.skills[skill_id]: mentions for skill_id, mentions in counts.items()}
+
+
+_matcher = None
+
+
+def get_skill_matcher(path=SKILLS_FILE):
+    # Built once per process from the dictionary file
+    global _matcher
+    if _matcher is None:
+        _matcher = SkillMatcher(load_skill_dictionary(path))
+        logging.info(f"Built skill matcher: {len(_matcher.skills)} skills, {len(_matcher.goto)} states")
+    return _matcher
+
+
+def add_skills(table, matcher=None):
+    # Extraction stage: append a 'skills' column, one list of
+    # {skill, mentions} per job, found in SKILL_FIELDS. The loader writes it
+    # to job_skills for the jobs it inserts or updates.
+    matcher = matcher or get_skill_matcher()
+    fields = [table[field].to_pylist() for field in SKILL_FIELDS if field in table.column_names]
+
+    with metrics.timer('skills'):
+        skills = [
+            [{'skill': skill, 'mentions': mentions} for skill, mentions in sorted(matcher.match(texts).items())]
+            for texts in zip(*fields)
+        ] if fields else [[] for _ in range(table.num_rows)]
+
+    return table.append_column('skills', pa.array(skills, SKILLS_TYPE))
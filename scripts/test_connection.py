@@ -1,29 +1,26 @@
-import psycopg
 import os
 from dotenv import load_dotenv
+from db import connect_to_db, get_pool, close_pool
 
 load_dotenv(override=True)
 
 
-def connect_to_db():
+def check_connection():
     print("DB_HOST=", os.getenv("DB_HOST"))
     print("DB_PASSWORD", os.getenv("DB_PASSWORD"))
 
-    try:
-        conn = psycopg.connect(
-            host = os.getenv('DB_HOST'),
-            dbname = "jobs_db",
-            user = "postgres",
-            password = os.getenv('DB_PASSWORD'),
-            port = 5432,
-            sslmode = "require",
-            connect_timeout = 10
-        )
-        print("Connection Successful")
-        return conn
+    conn = connect_to_db()
+    if conn:
+        conn.close()
 
+    # Also check the pool comes up and hands out healthy connections
+    try:
+        with get_pool().connection() as conn:
+            conn.execute('SELECT 1')
+        print("Pool Successful")
     except Exception as e:
-        print("Connection Failed", e)
-        return None
+        print("Pool Failed", e)
+    finally:
+        close_pool()
 
-connect_to_db()
\ No newline at end of file
+check_connection()
\ No newline at end of file
@@ -1,96 +1,58 @@
-import os
-import logging
-import psycopg
 from dotenv import load_dotenv
-import logging
-import sys
+from db import get_pool, connect_to_db
+from log_setup import setup_logging
 
 load_dotenv()
 
 
-log_dir = 'logs'
-file_name = 'transform_schemas.log'
-os.makedirs(log_dir, exist_ok=True)
+setup_logging('transform_schemas.log')
 
-logging.basicConfig(
-    filename=os.path.join(log_dir, file_name),
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-
-
-def connect_to_db():
-    conn = psycopg.connect(
-            host = os.getenv('DB_HOST'),
-            password = os.getenv('DB_PASSWORD'),
-            dbname = 'jobs_db',
-            user = 'postgres',
-            port = 5432,
-            sslmode = "require",
-            connect_timeout = 10
-        )
-    return conn
 
 def create_schema_in_postgres(schema_name: str):
-    conn = None
-    cursor = None
-
     try:
-        conn = connect_to_db()
-        print('connection was succesful')
-        cursor = conn.cursor()
+        # Borrow a warm connection from the shared pool instead of opening a new one
+        with get_pool().connection() as conn:
+            print('connection was succesful')
+            with conn.cursor() as cursor:
+                cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {schema_name};')
+                print(f'created schema {schema_name}')
 
-        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {schema_name};')
-        print(f'created schema {schema_name}')
+                cursor.execute(f'GRANT ALL ON SCHEMA {schema_name} TO postgres;')
+                print(f'granted all permission to schema {schema_name} to user postgres')
 
-        cursor.execute(f'GRANT ALL ON SCHEMA {schema_name} TO postgres;')
-        print(f'granted all permission to schema {schema_name} to user postgres')
-
-        conn.commit()
+            conn.commit()
 
         return True
 
     except Exception as e:
         print(f'Something is not working. Error {e}')
-        return False 
-    
-    finally:
-        if conn:
-            conn.close()
-        if cursor:
-            cursor.close()
+        return False
 
 def change_schema_name(existing_schema: str, new_name_schema:str):
-    conn = None
-    cursor = None
-
     try:
-        conn = connect_to_db()
-        print('connection succesful')
+        with get_pool().connection() as conn:
+            print('connection succesful')
 
-        conn.execute(f'ALTER SCHEMA {existing_schema} RENAME TO {new_name_schema};')
-        conn.commit()
-        print(f'Schema {existing_schema} successfully renamed to {new_name_schema}')
+            conn.execute(f'ALTER SCHEMA {existing_schema} RENAME TO {new_name_schema};')
+            conn.commit()
+            print(f'Schema {existing_schema} successfully renamed to {new_name_schema}')
 
     except Exception as e:
         print(f'Something went wrong. Error: {e}')
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
-def set_default_schema(schema_name):
-    conn = None
-    cursor = None
-
+def set_default_schema(schema_name, conn=None):
+    # Session-level only: sets the search_path of conn, or of a dedicated
+    # connection, never of a pooled one that other callers would inherit.
+    # To give every connection of a process a default schema, set
+    # DB_SEARCH_PATH instead.
+    own_conn = conn is None
     try:
-        conn = connect_to_db()
+        if own_conn:
+            conn = connect_to_db()
         print('connection succesful')
 
-        conn.execute(f'SET search_path TO Raw;')
+        # Bound as a value, the schema name cannot inject SQL
+        conn.execute('SELECT set_config(%s, %s, false)', ('search_path', schema_name))
         conn.commit()
         print(f'Set {schema_name} to default Schema')
 
@@ -98,9 +60,7 @@ def set_default_schema(schema_name):
         print(f'Something went wrong. Error: {e}')
 
     finally:
-        if cursor:
-            cursor.close()
-        if conn:
+        if own_conn and conn:
             conn.close()
 
 # create_schema_in_postgres('Prod')
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The pipeline modules import each other as top-level modules, the way they
+# run from scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
@@ -0,0 +1,33 @@
+from response_cache import ResponseCache
+
+
+def entry_size(tmp_path):
+    # Compressed size of one stored response, to set budgets in entries.
+    # Sizes vary by a byte or two with the params, hence the half entry slack.
+    cache = ResponseCache(str(tmp_path / 'probe'), max_bytes=10 ** 9)
+    cache.put({'q': 'data engineer', 'page': 0}, {'jobs_results': []})
+    return cache.stats()['size_bytes']
+
+
+def test_burst_past_the_cap_evicts_once(tmp_path):
+    size = entry_size(tmp_path)
+    cache = ResponseCache(str(tmp_path / 'cache'), max_bytes=int(20.5 * size))
+    for page in range(22):
+        cache.put({'q': 'data engineer', 'page': page}, {'jobs_results': []})
+
+    stats = cache.stats()
+    assert stats['eviction_passes'] == 1
+    assert stats['evictions'] >= 2
+    assert stats['size_bytes'] <= cache.max_bytes
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    size = entry_size(tmp_path)
+    cache = ResponseCache(str(tmp_path / 'cache'), max_bytes=int(10.5 * size))
+    for page in range(10):
+        cache.put({'q': 'data engineer', 'page': page}, {'jobs_results': []})
+    cache.get({'q': 'data engineer', 'page': 0})
+    cache.put({'q': 'data engineer', 'page': 10}, {'jobs_results': []})
+
+    assert cache.get({'q': 'data engineer', 'page': 0}) is not None
+    assert cache.get({'q': 'data engineer', 'page': 1}) is None
@@ -0,0 +1,60 @@
+import re
+
+from loader import JOBS_TABLE_DDL
+from search_jobs import search_jobs
+
+# Column names of jobs, read from the DDL so the check follows the schema
+JOB_TABLE_COLUMNS = set(re.findall(r'^\s+(\w+) [A-Z]', JOBS_TABLE_DDL, re.MULTILINE)) - {'PRIMARY'}
+
+
+class RecordingCursor:
+    # Stands in for a psycopg cursor: keeps the statement, returns no rows
+    description = []
+
+    def __init__(self, statements):
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+
+    def fetchall(self):
+        return []
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self):
+        return RecordingCursor(self.statements)
+
+
+def search_sql(**kwargs):
+    conn = RecordingConnection()
+    search_jobs(conn, 'spark -scala', **kwargs)
+    [(sql, params)] = conn.statements
+    return sql, params
+
+
+def test_job_columns_parsed():
+    assert {'job_id', 'query', 'search_vector', 'posted_at_ts'} <= JOB_TABLE_COLUMNS
+
+
+def test_tsquery_alias_is_not_a_job_column():
+    sql, _ = search_sql(location='Berlin', posted_since='2026-01-01')
+    alias = re.search(r"websearch_to_tsquery\('\w+', %s\) (\w+)", sql).group(1)
+    assert alias not in JOB_TABLE_COLUMNS
+    assert f'ts_rank_cd(search_vector, {alias})' in sql
+    assert f'search_vector @@ {alias}' in sql
+
+
+def test_filters_follow_placeholders():
+    sql, params = search_sql(limit=5, location='Berlin', posted_since='2026-01-01')
+    assert sql.count('%s') == len(params)
+    assert params == ['spark -scala', '%Berlin%', '2026-01-01', 5]
@@ -0,0 +1,19 @@
+from skills import SkillMatcher, load_skill_dictionary
+
+
+def write_dictionary(tmp_path, text):
+    path = tmp_path / 'skills.txt'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_hash_inside_a_skill_is_not_a_comment(tmp_path):
+    path = write_dictionary(tmp_path, "# Languages\nc#\nc++ | cpp  # alias\nf# | fsharp\n")
+    assert load_skill_dictionary(path) == {'c#': ['c#'], 'c++': ['c++', 'cpp'], 'f#': ['f#', 'fsharp']}
+
+
+def test_shipped_dictionary_matches_c_sharp():
+    matcher = SkillMatcher(load_skill_dictionary())
+    skills = matcher.match(["Experience with C# and .NET"])
+    assert skills.get('c#') == 1
+    assert 'c' not in skills